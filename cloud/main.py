@@ -26,8 +26,16 @@ from google.cloud import secretmanager
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaInMemoryUpload
+from googleapiclient.errors import HttpError
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from datetime import datetime
 import json
+import time
+import sys
+
+# CrawlProfiler deles med CLI-scraperne og ligger i scraper/profiling.py
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scraper'))
+from profiling import CrawlProfiler
 
 # Konfigurer logging til standard output
 logging.basicConfig(
@@ -46,6 +54,37 @@ headers = {
     )
 }
 
+# Prometheus-metrikker (eksponeres på /metrics) til autoskalering og overvågning
+PAGE_FETCH_SECONDS = Histogram(
+    'scraper_page_fetch_seconds', 'Tid for at hente en side: browserstart, navigation og rendering',
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+)
+PAGE_PARSE_SECONDS = Histogram(
+    'scraper_page_parse_seconds', 'Tid for parsing, konvertering og efterbehandling af en side',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+)
+UPLOAD_SECONDS = Histogram(
+    'scraper_upload_seconds', 'Tid for upload af en fil til Google Drive',
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+)
+ACTIVE_BROWSERS = Gauge('scraper_active_browsers', 'Antal kørende browserinstanser')
+QUEUED_JOBS = Gauge('scraper_queued_jobs', 'Antal /scrape-jobs der er modtaget og ikke afsluttet')
+QUEUED_PAGES = Gauge('scraper_queued_pages', 'Antal sider der venter på en ledig plads i crawlet')
+IN_FLIGHT_PAGES = Gauge('scraper_in_flight_pages', 'Antal sider der scrapes lige nu')
+RETRIES = Counter('scraper_retries_total', 'Antal genforsøg', ['operation'])
+DRIVE_RATE_LIMITED = Counter('scraper_drive_rate_limited_total', 'Antal 429-svar fra Google Drive')
+DOWNLOADED_BYTES = Counter('scraper_downloaded_bytes_total', 'Antal hentede bytes', ['kind'])
+
+class CountingRetry(Retry):
+    """
+    urllib3 Retry der tæller genforsøg i RETRIES.
+    """
+    def increment(self, *args, **kwargs):
+        # super() kaster MaxRetryError når forsøgene er opbrugt; kun egentlige genforsøg tælles
+        new_retry = super().increment(*args, **kwargs)
+        RETRIES.labels(operation='http').inc()
+        return new_retry
+
 def get_service_account_key(secret_name="serviceaccount"):
     """
     Henter service account nøgle JSON fra Google Secret Manager.
@@ -86,13 +125,19 @@ def upload_to_drive(file_name, file_content, folder_id):
         'name': file_name,
         'parents': [folder_id]
     }
+    start = time.perf_counter()
     try:
         file = drive_service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id'
         ).execute()
+        UPLOAD_SECONDS.observe(time.perf_counter() - start)
         logging.info(f"File {file_name} uploaded successfully. File ID: {file.get('id')}")
+    except HttpError as e:
+        if e.resp.status == 429:
+            DRIVE_RATE_LIMITED.inc()
+        logging.error(f"Failed to upload {file_name} to Google Drive: {e}")
     except Exception as e:
         logging.error(f"Failed to upload {file_name} to Google Drive: {e}")
 
@@ -230,7 +275,7 @@ class WebScraper:
         self.session.headers.update(self.headers)
 
         # Implementer Retry og HTTPAdapter for fejlhåndtering og genforsøg
-        retries = Retry(
+        retries = CountingRetry(
             total=5,  # Antal forsøg
             backoff_factor=1,  # Tid mellem forsøg (eksponentiel backoff)
             status_forcelist=[502, 503, 504],  # Statuskoder, der skal trigge et genforsøg
@@ -334,6 +379,7 @@ class WebScraper:
 
             if not html:
                 return
+            parse_start = time.perf_counter()
 
             # Ekstrakter Calendly URLs før parsing med BeautifulSoup
             calendly_urls = self.extract_calendly_urls(html)
@@ -446,6 +492,7 @@ class WebScraper:
 
             # (Valgfrit) Fjern tomme links fra den formaterede tekst
             formatted_text = re.sub(r'\[\]\(https?://[^\)]+\)', '', formatted_text)
+            PAGE_PARSE_SECONDS.observe(time.perf_counter() - parse_start)
 
             # Gem teksten i fil
             # Bestem hvilken mappe der skal bruges baseret på kategori
@@ -474,6 +521,8 @@ class WebScraper:
 
 
     def get_page_source_with_selenium(self, url):
+        fetch_start = time.perf_counter()
+        browser_launched = False
         try:
             options = Options()
             options.add_argument('--headless')
@@ -493,10 +542,14 @@ class WebScraper:
             logging.info(f"Using Chromedriver at: {service.path}")
             
             driver = webdriver.Chrome(service=service, options=options)
+            browser_launched = True
+            ACTIVE_BROWSERS.inc()
             driver.get(url)
             wait = WebDriverWait(driver, 5)
             wait.until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
             html = driver.page_source
+            PAGE_FETCH_SECONDS.observe(time.perf_counter() - fetch_start)
+            DOWNLOADED_BYTES.labels(kind='html').inc(len(html.encode('utf-8')))
             logging.info(f"Hentede indhold for: {url}")
             return html
         except WebDriverException as e:
@@ -510,6 +563,8 @@ class WebScraper:
                 driver.quit()
             except:
                 pass
+            if browser_launched:
+                ACTIVE_BROWSERS.dec()
 
 
 
@@ -985,8 +1040,14 @@ class WebScraper:
             semaphore = asyncio.Semaphore(10)  # Øget fra 5 til 10
 
             async def sem_task(task):
+                QUEUED_PAGES.inc()
                 async with semaphore:
-                    return await task
+                    QUEUED_PAGES.dec()
+                    IN_FLIGHT_PAGES.inc()
+                    try:
+                        return await task
+                    finally:
+                        IN_FLIGHT_PAGES.dec()
 
             results = await asyncio.gather(*(sem_task(task) for task in tasks), return_exceptions=True)
 
@@ -1053,8 +1114,15 @@ def scrape_website():
             'error': 'Invalid URL provided'
         }), 400, cors_headers)
 
+    QUEUED_JOBS.inc()
+    profiler = None
     try:
         scraper = WebScraper(base_url)
+        # Opt-in profilering af hele jobbet; artefakterne gemmes ved siden af outputtet
+        if request_json.get('profile', False):
+            profiler = CrawlProfiler(os.path.join(scraper.output_dir, 'profil'))
+            profiler.start()
+
         asyncio.run(scraper.run())
         files = scraper.get_scraped_files()
         process_and_upload_files(files, folder_id)
@@ -1068,11 +1136,21 @@ def scrape_website():
         metadata_content = '\n'.join([f"{k}: {v}" for k, v in metadata.items()])
         upload_to_drive('metadata.txt', metadata_content, folder_id)
 
-        return (jsonify({
+        response = {
             'url': base_url,
             'files_uploaded': len(files) + 1,  # +1 for metadata
             'status': 'success'
-        }), 200, cors_headers)
+        }
+        if profiler is not None and profiler.running:
+            timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+            response['profile'] = []
+            for path in profiler.stop():
+                name = f"{timestamp}_{os.path.basename(path)}"
+                with open(path, 'r', encoding='utf-8') as f:
+                    upload_to_drive(name, f.read(), folder_id)
+                response['profile'].append({'name': name, 'path': path})
+
+        return (jsonify(response), 200, cors_headers)
 
     except Exception as e:
         logging.error(f"Error processing request for {base_url}: {e}")
@@ -1081,6 +1159,17 @@ def scrape_website():
             'url': base_url,
             'status': 'error'
         }), 500, cors_headers)
+    finally:
+        QUEUED_JOBS.dec()
+        if profiler is not None and profiler.running:
+            profiler.stop()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus-endpoint med metrikker for scraping, browsere og Drive-upload.
+    """
+    return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
 
 if __name__ == "__main__":
     # Kør Flask serveren lokalt for testformål
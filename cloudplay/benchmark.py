@@ -0,0 +1,843 @@
+"""
+Benchmarks for scraperen.
+
+Kør fra cloudplay-mappen, fx:
+    python benchmark.py postprocess --paragraphs 5000 --repeat 5
+    python benchmark.py generate --pages 60 --output fixtures/site.jsonl.gz
+    python benchmark.py record https://www.kunde.dk --max-pages 40 --output fixtures/kunde.jsonl.gz
+    python benchmark.py run --fixture fixtures/site.jsonl.gz --fetch http --json resultat.json
+    python benchmark.py --module ../scraper/scraper.py run --fetch http
+    python benchmark.py compare gammel.json ny.json
+    python benchmark.py golden --golden-dir golden --update
+    python benchmark.py golden --golden-dir golden
+    python benchmark.py golden --legacy ../cloudplay27-11/main.py --fixture fixtures/kunde.jsonl.gz
+
+--module vælger hvilken af scraperne der måles (standard: main.py i denne mappe).
+Fixtures er gzip-komprimeret JSONL i WARC-stil: en "warcinfo"-linje med sitets base-URL
+efterfulgt af en "response"-linje pr. side (url, status, headers, body). Under "run"
+afspilles de fra en lokal HTTP-server, så målingerne ikke afhænger af netværket.
+"""
+import argparse
+import asyncio
+import gzip
+import http.server
+import importlib.util
+import inspect
+import json
+import logging
+import os
+import platform
+import random
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from datetime import datetime
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+
+# Scrapermodulet der måles; sættes af load_module ud fra --module
+scraper_module = None
+
+
+def load_module(path):
+    """
+    Indlæser en af scraperne fra en filsti. Modulet registreres under sit eget navn med
+    mappen på sys.path, så procespuljen i cloudplay kan importere det i worker-processer.
+    Kun ét modul pr. proces, da flere af dem registrerer de samme Prometheus-metrikker.
+    """
+    global scraper_module
+    path = os.path.abspath(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    scraper_module = module
+    return module
+
+
+def legacy_clean_and_normalize(text):
+    """
+    Den oprindelige clean_and_normalize med to separate regex-gennemløb og ubetinget NFKC.
+    """
+    text = re.sub(r'[\u200B-\u200D\uFEFF]', '', text)
+    text = re.sub(r'[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]', '', text)
+    return unicodedata.normalize('NFKC', text)
+
+
+def legacy_postprocess(body_text, links_text, filepath):
+    """
+    Den oprindelige kæde i scrape_page: seks gennemløb af hele dokumentet,
+    skrivning til fil og genindlæsning til fjernelse af gentagne sætninger.
+    """
+    # Fjern gentagne afsnit
+    unique_paragraphs = []
+    seen = set()
+    for para in body_text.split('\n\n'):
+        para_clean = legacy_clean_and_normalize(para.strip())
+        if para_clean and para_clean not in seen:
+            unique_paragraphs.append(para)
+            seen.add(para_clean)
+    formatted_text = '\n\n'.join(unique_paragraphs)
+    formatted_text += "\n\n" + links_text + "\n"
+
+    unwanted_text_pattern = re.compile(
+        r'(Existing iframe|Skip to content|Back to top|Loading\.\.\.|radar_avada|Page load link|Go to Top)',
+        re.IGNORECASE
+    )
+    formatted_text = unwanted_text_pattern.sub('', formatted_text)
+    formatted_text = legacy_clean_and_normalize(formatted_text)
+    formatted_text = "\n".join(line for line in formatted_text.splitlines() if "![](" not in line)
+    formatted_text = re.sub(r'\[\]\(https?://[^\)]+\)', '', formatted_text)
+
+    with open(filepath, "w", encoding="utf-8") as file:
+        file.write(formatted_text)
+
+    with open(filepath, "r", encoding="utf-8") as file:
+        lines = file.readlines()
+    unique_lines = []
+    previous_sentence = ""
+    for line in lines:
+        clean_sentences = []
+        for sentence in re.split(r'\. |\.\n', line.strip()):
+            sentence = sentence.strip()
+            if sentence and sentence != previous_sentence:
+                clean_sentences.append(sentence)
+                previous_sentence = sentence
+        unique_lines.append(". ".join(clean_sentences) + "\n" if clean_sentences else "\n")
+    with open(filepath, "w", encoding="utf-8") as file:
+        file.writelines(unique_lines)
+
+
+def fused_postprocess(scraper, body_text, links_text, filepath):
+    """
+    Den samlede efterbehandling som den køres i scrape_page.
+    """
+    with open(filepath, "w", encoding="utf-8") as file:
+        for idx, para in enumerate(scraper.postprocess_paragraphs(body_text, links_text)):
+            if idx:
+                file.write("\n\n")
+            file.write(para)
+        file.write("\n")
+
+
+def make_page(paragraph_count, seed=0):
+    """
+    Bygger en syntetisk stor side med gentagne afsnit, billedlinjer, tomme links og dansk tekst.
+    """
+    rng = random.Random(seed)
+    words = (
+        "vi tilbyder rådgivning om økonomi og regnskab til små og mellemstore virksomheder "
+        "kontakt os på telefon eller email så finder vi en løsning der passer til jer"
+    ).split()
+    paragraphs = []
+    for idx in range(paragraph_count):
+        roll = rng.random()
+        if roll < 0.15 and paragraphs:
+            paragraphs.append(rng.choice(paragraphs))
+        elif roll < 0.2:
+            paragraphs.append(f"![](https://example.com/billede-{idx}.png)")
+        elif roll < 0.25:
+            paragraphs.append(f"Skip to content [](https://example.com/{idx}) Back to top")
+        else:
+            sentence = ' '.join(rng.choice(words) for _ in range(12)).capitalize()
+            paragraphs.append(f"{sentence}. {sentence}. Afsnit {idx}\u200b.")
+    links = '\n'.join(f"- [https://example.com/side-{idx}](https://example.com/side-{idx})" for idx in range(200))
+    return "URL: https://example.com\n\n" + '\n\n'.join(paragraphs), "### Interne Links\n\n" + links + "\n"
+
+
+def time_runs(func, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def bench_postprocess(args):
+    scraper = scraper_module.WebScraper("https://example.com")
+    if not hasattr(scraper, 'postprocess_paragraphs'):
+        raise SystemExit(f"{args.module} har ingen postprocess_paragraphs; postprocess kræver cloudplay/main.py")
+    body_text, links_text = make_page(args.paragraphs)
+    print(f"Side: {len(body_text) + len(links_text)} tegn, {args.paragraphs} afsnit, {args.repeat} gentagelser")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy_path = os.path.join(tmp_dir, "legacy.txt")
+        fused_path = os.path.join(tmp_dir, "fused.txt")
+        legacy = time_runs(lambda: legacy_postprocess(body_text, links_text, legacy_path), args.repeat)
+        fused = time_runs(lambda: fused_postprocess(scraper, body_text, links_text, fused_path), args.repeat)
+
+    legacy_ms = statistics.median(legacy) * 1000
+    fused_ms = statistics.median(fused) * 1000
+    print(f"Oprindelig kæde: {legacy_ms:.1f} ms (median)")
+    print(f"Samlet gennemløb: {fused_ms:.1f} ms (median)")
+    print(f"Speedup: {legacy_ms / fused_ms:.2f}x")
+
+
+def percentile(values, fraction):
+    """
+    Percentil efter nearest-rank-metoden; values behøver ikke være sorteret.
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarize(durations):
+    """
+    Nøgletal i millisekunder for en liste af varigheder i sekunder.
+    """
+    if not durations:
+        return {'count': 0}
+    return {
+        'count': len(durations),
+        'p50_ms': round(percentile(durations, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(durations, 0.95) * 1000, 3),
+        'mean_ms': round(statistics.mean(durations) * 1000, 3),
+        'total_s': round(sum(durations), 4),
+    }
+
+
+def peak_rss_mb():
+    """
+    Højeste RSS for processen og dens afsluttede børn (fx workers i procespuljen), i MB.
+    """
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss er i KB på Linux og i bytes på macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {'self': round(self_kb / divisor, 1), 'children': round(children_kb / divisor, 1)}
+
+
+# --- Fixtures ---------------------------------------------------------------
+
+def write_fixture(path, base_url, records):
+    """
+    Skriver en fixture: en warcinfo-linje og en response-linje pr. side.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'type': 'warcinfo', 'base_url': base_url,
+                            'recorded': datetime.utcnow().isoformat() + 'Z'}) + '\n')
+        for record in records:
+            f.write(json.dumps({'type': 'response', **record}, ensure_ascii=False) + '\n')
+    print(f"Skrev {len(records)} sider til {path}")
+
+
+def read_fixture(path):
+    """
+    Returnerer (base_url, records) fra en fixture.
+    """
+    base_url = None
+    records = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['type'] == 'warcinfo':
+                base_url = record['base_url']
+            elif record['type'] == 'response':
+                records.append(record)
+    return base_url, records
+
+
+def make_site(page_count, seed=0, base_url="https://www.eksempel.dk"):
+    """
+    Bygger et syntetisk site: menu, footer og cookiebanner på alle sider, og indhold med
+    overskrifter, afsnit, tabeller, lister og links til andre sider på sitet.
+    """
+    rng = random.Random(seed)
+    words = (
+        "vi tilbyder rådgivning om økonomi og regnskab til små og mellemstore virksomheder "
+        "kontakt os på telefon eller email så finder vi en løsning der passer til jer"
+    ).split()
+    paths = ['/'] + [f"/side-{idx}" for idx in range(1, page_count)]
+
+    def sentence(length=14):
+        return ' '.join(rng.choice(words) for _ in range(length)).capitalize() + '.'
+
+    menu = ''.join(f'<li><a href="{path}">Menu {idx}</a></li>' for idx, path in enumerate(paths[:12]))
+    footer = f"<footer><p>{sentence(20)}</p><p>Kontakt: info@eksempel.dk</p></footer>"
+    records = []
+    for idx, path in enumerate(paths):
+        sections = []
+        for section in range(rng.randint(3, 8)):
+            sections.append(f"<h2>Afsnit {section} på side {idx}</h2>")
+            sections.extend(f"<p>{sentence()} {sentence()}</p>" for _ in range(rng.randint(2, 6)))
+            if rng.random() < 0.4:
+                rows = ''.join(
+                    f"<tr><td>Produkt {row}</td><td>{rng.randint(100, 9999)} kr.</td><td>{sentence(5)}</td></tr>"
+                    for row in range(rng.randint(3, 15))
+                )
+                sections.append(f"<table><tr><th>Navn</th><th>Pris</th><th>Note</th></tr>{rows}</table>")
+            if rng.random() < 0.4:
+                sections.append('<ul>' + ''.join(f"<li>{sentence(6)}</li>" for _ in range(5)) + '</ul>')
+            links = rng.sample(paths, min(5, len(paths)))
+            sections.append('<p>' + ' '.join(f'<a href="{link}?utm_source=nyhedsbrev">Læs mere</a>' for link in links) + '</p>')
+        body = (
+            f'<html><head><title>Side {idx}</title><script>var x = {idx};</script></head><body>'
+            f'<div class="cookie-banner">Vi bruger cookies</div><nav><ul>{menu}</ul></nav>'
+            f'<main><h1>Side {idx}</h1>{"".join(sections)}</main>{footer}</body></html>'
+        )
+        records.append({
+            'url': base_url.rstrip('/') + path if path != '/' else base_url,
+            'status': 200,
+            'headers': {'Content-Type': 'text/html; charset=utf-8'},
+            'body': body,
+        })
+    return base_url, records
+
+
+def bench_generate(args):
+    base_url, records = make_site(args.pages, args.seed)
+    write_fixture(args.output, base_url, records)
+
+
+def bench_record(args):
+    """
+    Optager et site til en fixture ved at hente forsiden og siderne den linker til (bredde-først)
+    med requests. Sider der kræver JavaScript optages som serveren leverer dem.
+    """
+    session = requests.Session()
+    session.headers.update({'User-Agent': 'Mozilla/5.0 (benchmark-optager)'})
+    base_url = args.url.rstrip('/')
+    host = urlsplit(base_url).hostname.removeprefix('www.')
+    queue = [base_url]
+    seen = {base_url}
+    records = []
+    while queue and len(records) < args.max_pages:
+        url = queue.pop(0)
+        try:
+            response = session.get(url, timeout=20)
+        except requests.RequestException as e:
+            print(f"Springer {url} over: {e}")
+            continue
+        content_type = response.headers.get('Content-Type', '')
+        records.append({
+            'url': url,
+            'status': response.status_code,
+            'headers': {'Content-Type': content_type},
+            'body': response.text,
+        })
+        if 'html' not in content_type:
+            continue
+        for tag in BeautifulSoup(response.text, 'html.parser').find_all('a', href=True):
+            link = urljoin(url, tag['href']).split('#')[0].rstrip('/')
+            if (urlsplit(link).hostname or '').removeprefix('www.') == host and link not in seen:
+                seen.add(link)
+                queue.append(link)
+    write_fixture(args.output, base_url, records)
+
+
+class FixtureServer:
+    """
+    Lokal HTTP-server der afspiller en fixture. Links til det optagne sites domæne
+    omskrives til serverens adresse, så hele crawlet bliver lokalt.
+    """
+    def __init__(self, base_url, records):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.origin = f"http://127.0.0.1:{self.server.server_port}"
+        host = urlsplit(base_url).hostname
+        hosts = {host, host.removeprefix('www.'), 'www.' + host.removeprefix('www.')}
+        self.rewrites = [(f"{scheme}//{name}", self.origin)
+                         for name in hosts for scheme in ('https:', 'http:', '')]
+        self.pages = {}
+        for record in records:
+            parts = urlsplit(record['url'])
+            key = (parts.path.rstrip('/') or '/') + (f"?{parts.query}" if parts.query else '')
+            body = record['body']
+            for old, new in self.rewrites:
+                body = body.replace(old, new)
+            self.pages[key] = (record['status'], record['headers'], body.encode('utf-8'))
+
+    def _handler(self):
+        fixture = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def respond(self, include_body):
+                parts = urlsplit(self.path)
+                key = parts.path.rstrip('/') or '/'
+                page = fixture.pages.get(key + (f"?{parts.query}" if parts.query else '')) or fixture.pages.get(key)
+                if page is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                status, headers, body = page
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if include_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self.respond(True)
+
+            def do_HEAD(self):
+                self.respond(False)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# --- Målinger ---------------------------------------------------------------
+
+def fetch_method_name(scraper):
+    """
+    Navnet på scraperens metode til at hente sidekilde (Selenium eller Playwright).
+    """
+    for name in ('get_page_source_with_playwright', 'get_page_source_with_selenium'):
+        if hasattr(scraper, name):
+            return name
+    raise SystemExit("Modulets WebScraper har ingen get_page_source-metode")
+
+
+def prepare_scraper(base_url, origin, output_dir, fetch):
+    """
+    Opretter en WebScraper der skriver til output_dir og kun henter fra fixture-serveren.
+    Med fetch='http' erstattes browseren af et almindeligt HTTP-kald, så målingen viser
+    konverteringen uden browserens startomkostning.
+    """
+    scraper = scraper_module.WebScraper(base_url)
+    scraper.output_dir = output_dir
+    scraper.internal_output_dir = os.path.join(output_dir, "interne")
+    scraper.external_output_dir = os.path.join(output_dir, "eksterne")
+    os.makedirs(scraper.internal_output_dir, exist_ok=True)
+    os.makedirs(scraper.external_output_dir, exist_ok=True)
+
+    name = fetch_method_name(scraper)
+    original = getattr(scraper, name)
+    session = requests.Session()
+
+    def fetch_http(url):
+        response = session.get(url, timeout=30)
+        return response.text if response.ok else None
+
+    if inspect.iscoroutinefunction(original):
+        async def fetch_page(url, *args, **kwargs):
+            if not url.startswith(origin):
+                return None
+            if fetch == 'http':
+                return await asyncio.get_running_loop().run_in_executor(None, fetch_http, url)
+            return await original(url, *args, **kwargs)
+    else:
+        def fetch_page(url, *args, **kwargs):
+            if not url.startswith(origin):
+                return None
+            if fetch == 'http':
+                return fetch_http(url)
+            return original(url, *args, **kwargs)
+    setattr(scraper, name, fetch_page)
+
+    # Pre-flight (cloudplay) må heller ikke gå på nettet
+    if hasattr(scraper, 'fetch_headers'):
+        original_headers = scraper.fetch_headers
+        scraper.fetch_headers = lambda url: original_headers(url) if url.startswith(origin) else None
+    return scraper
+
+
+def bench_end_to_end(base_url, origin, fetch, repeat):
+    """
+    Kører WebScraper.run mod fixture-serveren og måler samlet tid og tid pr. side.
+    """
+    runs = []
+    page_durations = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as output_dir:
+            scraper = prepare_scraper(base_url, origin, output_dir, fetch)
+            original_scrape_page = scraper.scrape_page
+
+            async def timed_scrape_page(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original_scrape_page(*args, **kwargs)
+                finally:
+                    page_durations.append(time.perf_counter() - start)
+            scraper.scrape_page = timed_scrape_page
+
+            start = time.perf_counter()
+            asyncio.run(scraper.run())
+            elapsed = time.perf_counter() - start
+            pages = sum(len(files) for _, _, files in os.walk(output_dir))
+            runs.append({'seconds': round(elapsed, 4), 'pages': pages})
+
+    total_pages = sum(run['pages'] for run in runs)
+    total_seconds = sum(run['seconds'] for run in runs)
+    return {
+        'runs': runs,
+        'pages_per_second': round(total_pages / total_seconds, 2) if total_seconds else None,
+        'page_latency': summarize(page_durations),
+    }
+
+
+def bench_stages(base_url, records, origin, repeat):
+    """
+    Måler de enkelte trin pr. side direkte på HTML fra fixturen.
+    """
+    scraper = scraper_module.WebScraper(base_url)
+    durations = {'process_element': [], 'convert_table_to_markdown': [],
+                 'postprocess': [], 'link_filter': []}
+    link_count = 0
+    for _ in range(repeat):
+        for record in records:
+            if 'html' not in record['headers'].get('Content-Type', ''):
+                continue
+            html = record['body']
+            page_url = record['url']
+
+            # process_element på <body>, som i scrape_page
+            body = BeautifulSoup(html, 'html.parser').find('body')
+            if body is None:
+                continue
+            start = time.perf_counter()
+            text = scraper.process_element(body, url=page_url)
+            durations['process_element'].append(time.perf_counter() - start)
+
+            # Tabeller i en frisk parse, da process_element kan ændre træet
+            tables = BeautifulSoup(html, 'html.parser').find_all('table')
+            if tables:
+                start = time.perf_counter()
+                for table in tables:
+                    scraper.convert_table_to_markdown(table)
+                durations['convert_table_to_markdown'].append(time.perf_counter() - start)
+
+            # Efterbehandlingen som den køres i scrape_page; ældre scrapere har kun afsnits-dedupe
+            start = time.perf_counter()
+            if hasattr(scraper, 'postprocess_paragraphs'):
+                list(scraper.postprocess_paragraphs(text))
+            else:
+                scraper.remove_duplicate_paragraphs(text)
+            durations['postprocess'].append(time.perf_counter() - start)
+
+            links = [urljoin(page_url, tag['href']) for tag in body.find_all('a', href=True)]
+            link_count += len(links)
+            start = time.perf_counter()
+            for link in links:
+                scraper.is_relevant_link(link)
+            durations['link_filter'].append(time.perf_counter() - start)
+
+    return {stage: summarize(values) for stage, values in durations.items()} | {'links_checked': link_count}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_run(args):
+    if args.fixture:
+        base_url, records = read_fixture(args.fixture)
+    else:
+        base_url, records = make_site(args.pages)
+    print(f"Modul: {args.module}, {len(records)} sider, fetch={args.fetch}, {args.repeat} gentagelser")
+
+    with FixtureServer(base_url, records) as server:
+        local_records = [
+            {**record, 'url': server.origin + (urlsplit(record['url']).path or '/')} for record in records
+        ]
+        stages = bench_stages(server.origin, local_records, server.origin, args.repeat)
+        end_to_end = bench_end_to_end(server.origin, server.origin, args.fetch, args.repeat)
+
+    result = {
+        'module': os.path.relpath(os.path.abspath(args.module)),
+        'commit': git_commit(),
+        'date': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'fixture': args.fixture or f"syntetisk ({args.pages} sider)",
+        'pages': len(records),
+        'fetch': args.fetch,
+        'repeat': args.repeat,
+        'end_to_end': end_to_end,
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    print(f"Ende-til-ende: {end_to_end['pages_per_second']} sider/s, "
+          f"p50 {end_to_end['page_latency'].get('p50_ms')} ms, p95 {end_to_end['page_latency'].get('p95_ms')} ms pr. side")
+    for stage, summary in stages.items():
+        if isinstance(summary, dict) and summary.get('count'):
+            print(f"  {stage:28} p50 {summary['p50_ms']:9.3f} ms   p95 {summary['p95_ms']:9.3f} ms   ({summary['count']} målinger)")
+    print(f"Peak RSS: {result['peak_rss_mb']['self']} MB (workers: {result['peak_rss_mb']['children']} MB)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Resultat gemt i {args.json}")
+
+
+def bench_compare(args):
+    """
+    Sammenligner to resultatfiler fra "run" (fx fra to commits) trin for trin.
+    """
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+
+    rows = [('ende-til-ende pr. side', old['end_to_end']['page_latency'], new['end_to_end']['page_latency'])]
+    rows += [(stage, old['stages'].get(stage, {}), summary) for stage, summary in new['stages'].items()
+             if isinstance(summary, dict)]
+    for name, before, after in rows:
+        if not before.get('count') or not after.get('count'):
+            continue
+        ratio = before['p50_ms'] / after['p50_ms'] if after['p50_ms'] else float('inf')
+        print(f"  {name:28} p50 {before['p50_ms']:9.3f} -> {after['p50_ms']:9.3f} ms  ({ratio:.2f}x)")
+    print(f"  {'peak RSS':28} {old['peak_rss_mb']['self']} -> {new['peak_rss_mb']['self']} MB")
+
+
+# --- Golden output -----------------------------------------------------------
+
+def load_corpus(fixtures, pages):
+    """
+    Returnerer [(nøgle, url, html)] for alle HTML-sider i fixturerne, eller for et
+    syntetisk site med det givne antal sider, hvis ingen fixtures er angivet.
+    """
+    if fixtures:
+        sources = [(os.path.basename(path).split('.')[0], read_fixture(path)[1]) for path in fixtures]
+    else:
+        sources = [('syntetisk', make_site(pages)[1])]
+    corpus = []
+    for stem, records in sources:
+        for idx, record in enumerate(records):
+            if 'html' in record['headers'].get('Content-Type', ''):
+                corpus.append((f"{stem}/{idx:04d}.md", record['url'], record['body']))
+    return corpus
+
+
+def convert_corpus(corpus, output_dir):
+    """
+    Konverterer hver side med modulets scrape_page, som den ville blive gemt, men med
+    HTML fra korpusset i stedet for browseren. Returnerer tid pr. side i sekunder.
+    """
+    html_by_url = {url: html for _, url, html in corpus}
+    timings = {}
+
+    async def convert_all():
+        for key, url, _ in corpus:
+            with tempfile.TemporaryDirectory() as page_dir:
+                # Nyt scraper-objekt pr. side, så sider ikke påvirker hinanden via tilstand
+                scraper = scraper_module.WebScraper(re.match(r'https?://[^/]+', url).group(0))
+                scraper.output_dir = page_dir
+                scraper.internal_output_dir = scraper.external_output_dir = page_dir
+                if hasattr(scraper, 'collapse_canonical_aliases'):
+                    scraper.collapse_canonical_aliases = False
+                if hasattr(scraper, 'preflight'):
+                    scraper.preflight = False
+                name = fetch_method_name(scraper)
+                if inspect.iscoroutinefunction(getattr(scraper, name)):
+                    async def fetch_page(page_url, *args, **kwargs):
+                        return html_by_url[page_url]
+                else:
+                    def fetch_page(page_url, *args, **kwargs):
+                        return html_by_url[page_url]
+                setattr(scraper, name, fetch_page)
+
+                start = time.perf_counter()
+                try:
+                    await scraper.scrape_page(url, "side.txt", "interne")
+                except Exception as e:
+                    logging.warning(f"{key}: {e}")
+                timings[key] = time.perf_counter() - start
+
+                page_path = os.path.join(page_dir, "side.txt")
+                markdown = ''
+                if os.path.exists(page_path):
+                    with open(page_path, encoding='utf-8') as f:
+                        markdown = f.read()
+            target = os.path.join(output_dir, key)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'w', encoding='utf-8') as f:
+                f.write(markdown)
+
+    asyncio.run(convert_all())
+    return timings
+
+
+def bench_convert(args):
+    """
+    Intern subkommando for golden: konverterer korpusset med --module og skriver
+    Markdown samt timings.json til --output.
+    """
+    corpus = load_corpus(args.fixture, args.pages)
+    timings = convert_corpus(corpus, args.output)
+    with open(os.path.join(args.output, 'timings.json'), 'w', encoding='utf-8') as f:
+        json.dump({'module': args.module, 'commit': git_commit(), 'timings': timings}, f, indent=2)
+
+
+def run_convert(module, args, output_dir):
+    """
+    Kører convert for et modul i en separat proces, så to versioner af scraperen
+    (der begge hedder main) ikke kolliderer i samme interpreter.
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--module', module, 'convert',
+               '--output', output_dir, '--pages', str(args.pages)]
+    for fixture in args.fixture or []:
+        command += ['--fixture', fixture]
+    # Konverteringen måles i processen selv; procespuljen ville kun måle IPC
+    subprocess.run(command, check=True, env={**os.environ, 'PARSE_WORKERS': '0'})
+    with open(os.path.join(output_dir, 'timings.json'), encoding='utf-8') as f:
+        return json.load(f)['timings']
+
+
+def read_outputs(directory, keys):
+    outputs = {}
+    for key in keys:
+        path = os.path.join(directory, key)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                outputs[key] = f.read()
+    return outputs
+
+
+def bench_golden(args):
+    """
+    Sammenligner kandidatens Markdown (--module) side for side med referencen: enten de
+    gemte golden-filer i --golden-dir eller et legacy-modul (--legacy), og rapporterer
+    forskelle og hastighedsforhold. --update gemmer referencens output som nye golden-filer.
+    Afslutter med kode 1, hvis output afviger.
+    """
+    import difflib
+    import shutil
+
+    keys = [key for key, _, _ in load_corpus(args.fixture, args.pages)]
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.update:
+            reference_module = args.legacy or args.module
+            timings = run_convert(reference_module, args, work_dir)
+            shutil.rmtree(args.golden_dir, ignore_errors=True)
+            shutil.copytree(work_dir, args.golden_dir)
+            print(f"Gemte {len(timings)} golden-filer fra {reference_module} i {args.golden_dir}")
+            return
+
+        if args.legacy:
+            reference_dir = os.path.join(work_dir, 'legacy')
+            reference_timings = run_convert(args.legacy, args, reference_dir)
+            reference_name = args.legacy
+        else:
+            reference_dir = args.golden_dir
+            with open(os.path.join(reference_dir, 'timings.json'), encoding='utf-8') as f:
+                reference_timings = json.load(f)['timings']
+            reference_name = f"golden ({reference_dir})"
+
+        candidate_dir = os.path.join(work_dir, 'kandidat')
+        candidate_timings = run_convert(args.module, args, candidate_dir)
+
+        expected = read_outputs(reference_dir, keys)
+        actual = read_outputs(candidate_dir, keys)
+
+    differing = [key for key in keys if expected.get(key) != actual.get(key)]
+    print(f"Reference: {reference_name}")
+    print(f"Kandidat:  {args.module}")
+    print(f"{len(keys) - len(differing)} af {len(keys)} sider er identiske")
+
+    for key in differing[:args.show_diffs]:
+        diff = difflib.unified_diff(
+            expected.get(key, '').splitlines(), actual.get(key, '').splitlines(),
+            fromfile=f"reference/{key}", tofile=f"kandidat/{key}", lineterm='', n=1
+        )
+        print('\n'.join(list(diff)[:args.diff_lines]))
+    if len(differing) > args.show_diffs:
+        print(f"... og {len(differing) - args.show_diffs} sider mere med forskelle")
+
+    common = [key for key in keys if key in reference_timings and key in candidate_timings]
+    if common:
+        reference_total = sum(reference_timings[key] for key in common)
+        candidate_total = sum(candidate_timings[key] for key in common)
+        ratios = [reference_timings[key] / candidate_timings[key] for key in common if candidate_timings[key]]
+        print(f"Tid i alt: {reference_total:.3f} s -> {candidate_total:.3f} s "
+              f"({reference_total / candidate_total:.2f}x), median pr. side {statistics.median(ratios):.2f}x")
+
+    if differing:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for scraperen")
+    parser.add_argument("--module", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"),
+                        help="Sti til scrapermodulet der skal måles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    postprocess = subparsers.add_parser("postprocess", help="Efterbehandling: oprindelig kæde mod samlet gennemløb")
+    postprocess.add_argument("--paragraphs", type=int, default=5000)
+    postprocess.add_argument("--repeat", type=int, default=5)
+    postprocess.set_defaults(func=bench_postprocess)
+
+    generate = subparsers.add_parser("generate", help="Skriv en syntetisk fixture")
+    generate.add_argument("--pages", type=int, default=60)
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--output", required=True)
+    generate.set_defaults(func=bench_generate, needs_module=False)
+
+    record = subparsers.add_parser("record", help="Optag et site til en fixture")
+    record.add_argument("url")
+    record.add_argument("--max-pages", type=int, default=50)
+    record.add_argument("--output", required=True)
+    record.set_defaults(func=bench_record, needs_module=False)
+
+    run = subparsers.add_parser("run", help="Afspil en fixture gennem WebScraper og mål trin og ende-til-ende")
+    run.add_argument("--fixture", help="Fixture-fil (standard: syntetisk site)")
+    run.add_argument("--pages", type=int, default=60, help="Antal sider i det syntetiske site")
+    run.add_argument("--fetch", choices=("http", "browser"), default="browser",
+                     help="Hent sider med browseren (som i drift) eller med et almindeligt HTTP-kald")
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--json", help="Gem resultatet som JSON")
+    run.set_defaults(func=bench_run)
+
+    compare = subparsers.add_parser("compare", help="Sammenlign to JSON-resultater")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.set_defaults(func=bench_compare, needs_module=False)
+
+    golden = subparsers.add_parser("golden", help="Sammenlign konverterens output med golden-filer eller et legacy-modul")
+    golden.add_argument("--fixture", action="append", help="Fixture-fil; kan gentages (standard: syntetisk site)")
+    golden.add_argument("--pages", type=int, default=200, help="Antal sider i det syntetiske site")
+    golden.add_argument("--golden-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden"))
+    golden.add_argument("--legacy", help="Modul der bruges som reference i stedet for golden-filerne")
+    golden.add_argument("--update", action="store_true", help="Gem referencens output som nye golden-filer")
+    golden.add_argument("--show-diffs", type=int, default=5, help="Antal sider med forskelle der vises")
+    golden.add_argument("--diff-lines", type=int, default=40, help="Maks. antal linjer pr. diff")
+    golden.set_defaults(func=bench_golden, needs_module=False)
+
+    convert = subparsers.add_parser("convert", help=argparse.SUPPRESS)
+    convert.add_argument("--fixture", action="append")
+    convert.add_argument("--pages", type=int, default=200)
+    convert.add_argument("--output", required=True)
+    convert.set_defaults(func=bench_convert)
+
+    args = parser.parse_args()
+    # Scraperne logger hvert fjernet afsnit på INFO, hvilket ellers dominerer målingerne.
+    # LOG_LEVEL arves af worker-processerne i cloudplays procespulje.
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if getattr(args, 'needs_module', True):
+        load_module(args.module)
+    logging.getLogger().setLevel(logging.WARNING)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
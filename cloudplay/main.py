@@ -4,27 +4,66 @@ import re
 import json
 import logging
 import unicodedata
+import hashlib
+import io
+import threading
+import sys
+import sqlite3
+import zlib
+import uuid
+import functools
+import itertools
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse, urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
 from flask import Flask, request, jsonify
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup, NavigableString, Comment
 from playwright.async_api import async_playwright
 import uvicorn
 from google.cloud import secretmanager
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaInMemoryUpload
+from googleapiclient.http import MediaIoBaseUpload
 from googleapiclient.errors import HttpError
 
 from asgiref.wsgi import WsgiToAsgi
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 import time
+import tempfile
+import shutil
+import gzip
+import resource
+
+# Valgfrie afhængigheder til udtræk af tekst fra dokumenter
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+try:
+    import docx
+except ImportError:
+    docx = None
+# Valgfri zstd-komprimering af bundle-output
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# CrawlProfiler deles med CLI-scraperne og ligger i scraper/profiling.py. I containeren
+# kopieres modulet ved siden af main.py (se Dockerfile), ellers findes det via stien her
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scraper'))
+from profiling import CrawlProfiler
 
 # Konfigurer logging til standard output
 logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s',
-    level=logging.INFO  # Ændret til INFO for kun nødvendige logs
+    level=os.environ.get("LOG_LEVEL", "INFO")  # INFO som standard; LOG_LEVEL gælder også worker-processer
 )
 
 app = Flask(__name__)
@@ -38,6 +77,163 @@ HEADERS = {
         "Chrome/116.0.0.0 Safari/537.36"
     )
 }
+# Chromium-flag til headless kørsel i en container
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-software-rasterizer'
+]
+
+# Zero-width space og kontroltegn (bevarer \n og \r)
+CONTROL_CHARS_PATTERN = re.compile(r'[\u200B-\u200D\uFEFF\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]')
+# Uønsket tekst der fjernes fra alle sider. Sætningerne med små bogstaver bruges som
+# hurtigt forfilter, så det (langsomme) case-insensitive regex kun køres hvor det rammer.
+UNWANTED_TEXT = (
+    'existing iframe', 'skip to content', 'back to top', 'loading...',
+    'radar_avada', 'page load link', 'go to top'
+)
+UNWANTED_TEXT_PATTERN = re.compile(
+    r'(Existing iframe|Skip to content|Back to top|Loading\.\.\.|radar_avada|Page load link|Go to Top)',
+    re.IGNORECASE
+)
+# Tomme Markdown-links, fx "[](https://...)"
+EMPTY_LINK_PATTERN = re.compile(r'\[\]\(https?://[^\)]+\)')
+# Sætningsgrænser brugt ved fjernelse af gentagne sætninger
+SENTENCE_SPLIT_PATTERN = re.compile(r'\. |\.\n')
+
+# Query-parametre der kun bruges til tracking og ikke ændrer sidens indhold (ud over utm_*)
+TRACKING_PARAMS = {
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga', '_gl', 'ref_src'
+}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Content-Types der renderes i browseren
+HTML_CONTENT_TYPES = {'text/html', 'application/xhtml+xml'}
+# Dokumenttyper der ikke renderes, men sendes videre til en dokument-udtrækker
+DOCUMENT_CONTENT_TYPES = {
+    'application/pdf': 'pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'docx',
+}
+DOCUMENT_EXTENSIONS = {'.pdf': 'pdf', '.docx': 'docx'}
+
+# Reservation i hukommelsesbudgettet for en side uden Content-Length, før der er målt sider
+DEFAULT_PAGE_BYTES_ESTIMATE = 512 * 1024
+
+# Checkpoints for igangværende crawls. Skal de overleve en genstart af instansen, skal
+# CHECKPOINT_DIR pege på et monteret volumen frem for /tmp. Checkpoints og arbejdskøen er
+# sqlite-filer, så volumenet skal understøtte fillåsning (fx Filestore/NFS); Cloud Storage
+# FUSE gør ikke, og sqlite kan blive korrupt dér, især med flere workers.
+CHECKPOINT_DIR = os.environ.get("CHECKPOINT_DIR", "/tmp/checkpoints")
+# Ældre checkpoints genoptages ikke; jobbet starter forfra
+CHECKPOINT_MAX_AGE = float(os.environ.get("CHECKPOINT_MAX_AGE_HOURS", 24)) * 3600
+# Sidestatus der tæller som færdig i et checkpoint; 'failed' prøves igen ved genoptagelse
+CHECKPOINT_STATUSES = ('saved', 'skipped')
+
+# Delt arbejdskø for distribueret crawl; skal ligge på et volumen alle workers kan nå
+WORK_QUEUE_PATH = os.environ.get("WORK_QUEUE_PATH", os.path.join(CHECKPOINT_DIR, "queue.sqlite"))
+# En opgave hvis worker ikke melder tilbage inden for lease-tiden, gives til en anden worker
+WORK_LEASE_SECONDS = int(os.environ.get("WORK_LEASE_SECONDS", 300))
+WORK_MAX_ATTEMPTS = int(os.environ.get("WORK_MAX_ATTEMPTS", 3))
+
+# Et site crawlet inden for så mange sekunder genbruges fra resultatcachen (0 = slået fra)
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", 900))
+
+# Antal langsomste sider der returneres med fasetider i /scrape-svaret
+TIMINGS_SLOWEST_PAGES = int(os.environ.get("TIMINGS_SLOWEST_PAGES", 10))
+
+# Højeste antal sites i én /scrape/batch-forespørgsel
+BATCH_MAX_SITES = int(os.environ.get("BATCH_MAX_SITES", 10))
+
+# Størrelse på hver del i en resumable upload. Drive kræver et multiplum af 256 KiB.
+DRIVE_CHUNK_SIZE = max(1, int(os.environ.get("DRIVE_CHUNK_SIZE", 8 * 1024 * 1024)) // (256 * 1024)) * 256 * 1024
+# HTTP-statuskoder der behandles som midlertidige fejl under upload
+DRIVE_RETRY_STATUSES = (403, 429, 500, 502, 503, 504)
+
+# Bundle-output: filendelse og MIME-type pr. komprimering
+BUNDLE_COMPRESSIONS = {
+    None: ('.jsonl', 'application/x-ndjson'),
+    'gzip': ('.jsonl.gz', 'application/gzip'),
+    'zstd': ('.jsonl.zst', 'application/zstd'),
+}
+# MIME-typer scraperen selv uploader; kun disse slettes ved Drive-synkronisering
+OUTPUT_MIMETYPES = {'text/plain', *(mimetype for _, mimetype in BUNDLE_COMPRESSIONS.values())}
+# Mærke på alle filer scraperen uploader; synkronisering lister og sletter kun mærkede filer,
+# så filer som brugere selv har lagt i mappen aldrig røres
+DRIVE_APP_PROPERTIES = {'cloudplay': '1'}
+# Første Markdown-overskrift på en side bruges som titel i bundle-output
+HEADING_PATTERN = re.compile(r'^#{1,6} +(.+?)\s*$', re.MULTILINE)
+
+# Prometheus-metrikker (eksponeres på /metrics) til autoskalering og overvågning
+PAGE_FETCH_SECONDS = Histogram(
+    'scraper_page_fetch_seconds', 'Tid for at hente en side: browserstart, navigation og rendering',
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+)
+PAGE_PARSE_SECONDS = Histogram(
+    'scraper_page_parse_seconds', 'Tid for parsing, konvertering og efterbehandling af en side',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+)
+UPLOAD_SECONDS = Histogram(
+    'scraper_upload_seconds', 'Tid for upload af en fil til Google Drive',
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+)
+ACTIVE_BROWSERS = Gauge('scraper_active_browsers', 'Antal kørende browserinstanser')
+QUEUED_JOBS = Gauge('scraper_queued_jobs', 'Antal /scrape-jobs der er modtaget og ikke afsluttet')
+QUEUED_PAGES = Gauge('scraper_queued_pages', 'Antal sider der venter på en ledig plads i crawlet')
+IN_FLIGHT_PAGES = Gauge('scraper_in_flight_pages', 'Antal sider der scrapes lige nu')
+RETRIES = Counter('scraper_retries_total', 'Antal genforsøg', ['operation'])
+DRIVE_RATE_LIMITED = Counter('scraper_drive_rate_limited_total', 'Antal 429-svar fra Google Drive')
+DOWNLOADED_BYTES = Counter('scraper_downloaded_bytes_total', 'Antal hentede bytes', ['kind'])
+
+class CountingRetry(Retry):
+    """
+    urllib3 Retry der tæller genforsøg i RETRIES.
+    """
+    def increment(self, *args, **kwargs):
+        # super() kaster MaxRetryError når forsøgene er opbrugt; kun egentlige genforsøg tælles
+        new_retry = super().increment(*args, **kwargs)
+        RETRIES.labels(operation='http').inc()
+        return new_retry
+
+def canonicalize_url(url, base_url=None):
+    """
+    Normaliserer en URL, så varianter af samme side giver samme streng: små bogstaver i
+    scheme og host, ingen standardport, fragment eller tracking-parametre, sorteret query,
+    samlede dobbelte skråstreger og ingen afsluttende skråstreg. Er base_url angivet,
+    skrives sitets egne URLs (med/uden www., http/https) om til base_url's scheme og host.
+    Andre schemes end http(s) returneres uændret.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+
+    host = (parts.hostname or '').rstrip('.')
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+
+    if base_url:
+        base_parts = urlsplit(base_url)
+        base_host = base_parts.hostname or ''
+        if host.removeprefix('www.') == base_host.removeprefix('www.'):
+            scheme, host = base_parts.scheme.lower(), base_host
+            port = base_parts.port
+
+    # hostname fjerner klammerne om IPv6-adresser; de skal tilbage, før porten sættes på
+    netloc = f"[{host}]" if ':' in host else host
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc += f":{port}"
+
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/')
+
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    ))
+
+    return urlunsplit((scheme, netloc, path, query, ''))
 
 def get_service_account_key(secret_name="serviceaccount"):
     """
@@ -77,49 +273,305 @@ def initialize_drive_api():
         logging.error(f"Fejl ved initialisering af Google Drive API: {e}", exc_info=True)
         raise
 
-def upload_to_drive(file_name, file_content, folder_id):
+def upload_stream_to_drive(file_name, stream, folder_id, mimetype='text/plain', file_id=None, drive_service=None):
     """
-    Upload en fil til Google Drive med retry logik og support for fællesdrev.
+    Uploader en fil til Google Drive fra en binær stream i dele af DRIVE_CHUNK_SIZE.
+    Ved midlertidige fejl genoptages uploaden fra den sidst bekræftede del i stedet for
+    at starte forfra, så hukommelsesforbruget er uafhængigt af filens størrelse.
+    Er file_id angivet, opdateres indholdet af den eksisterende fil i stedet.
     """
-    max_retries = 3
+    max_retries = 5
     retry_delay = 1  # sekunder
+    start = time.perf_counter()
 
-    for attempt in range(max_retries):
-        try:
-            drive_service = initialize_drive_api()
-            # Opret en MediaInMemoryUpload til at uploade filindholdet
-            media = MediaInMemoryUpload(
-                file_content.encode('utf-8'),
-                mimetype='text/plain',
-                resumable=True  # Resumable upload support
+    try:
+        drive_service = drive_service or initialize_drive_api()
+        media = MediaIoBaseUpload(stream, mimetype=mimetype, chunksize=DRIVE_CHUNK_SIZE, resumable=True)
+        if file_id:
+            upload_request = drive_service.files().update(
+                fileId=file_id,
+                body={'appProperties': DRIVE_APP_PROPERTIES},
+                media_body=media,
+                fields='id',
+                supportsAllDrives=True
             )
+        else:
             file_metadata = {
                 'name': file_name,
-                'parents': [folder_id]
+                'parents': [folder_id],
+                'appProperties': DRIVE_APP_PROPERTIES
             }
-            file = drive_service.files().create(
+            upload_request = drive_service.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields='id',
                 supportsAllDrives=True  # Understøttelse for fællesdrev
-            ).execute()
-            
-            logging.info(f"Fil {file_name} uploadet succesfuldt. Fil ID: {file.get('id')}")
-            return file.get('id')
-
-        except HttpError as error:
-            if error.resp.status in [403, 429, 500, 503]:  # Rate limit eller serverfejl
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                    logging.warning(f"Retry {attempt + 1}/{max_retries} efter {wait_time}s for {file_name}")
+            )
+
+        response = None
+        failures = 0
+        while response is None:
+            try:
+                status, response = upload_request.next_chunk()
+                failures = 0
+                if status:
+                    logging.info(f"Upload af {file_name}: {int(status.progress() * 100)}%")
+            except HttpError as error:
+                if error.resp.status == 429:
+                    DRIVE_RATE_LIMITED.inc()
+                if error.resp.status in DRIVE_RETRY_STATUSES and failures < max_retries:
+                    RETRIES.labels(operation='drive_upload').inc()
+                    wait_time = retry_delay * (2 ** failures)  # Exponential backoff
+                    failures += 1
+                    logging.warning(f"Retry {failures}/{max_retries} efter {wait_time}s for {file_name}")
                     time.sleep(wait_time)
                     continue
-            logging.error(f"Drive API fejl: {str(error)}")
-            raise
-        except Exception as e:
-            logging.error(f"Uventet fejl ved upload af {file_name}: {str(e)}")
-            raise
+                logging.error(f"Drive API fejl: {str(error)}")
+                raise
+
+        UPLOAD_SECONDS.observe(time.perf_counter() - start)
+        logging.info(f"Fil {file_name} uploadet succesfuldt. Fil ID: {response.get('id')}")
+        return response.get('id')
+
+    except HttpError:
+        raise
+    except Exception as e:
+        logging.error(f"Uventet fejl ved upload af {file_name}: {str(e)}")
+        raise
+
+def upload_file_to_drive(file_name, file_path, folder_id, mimetype='text/plain', file_id=None, drive_service=None):
+    """
+    Uploader en fil fra disken til Google Drive uden at læse den ind i hukommelsen.
+    """
+    with open(file_path, 'rb') as stream:
+        return upload_stream_to_drive(file_name, stream, folder_id, mimetype, file_id, drive_service)
+
+def copy_drive_files(files, folder_id, drive_service=None):
+    """
+    Kopierer Drive-filer ({'name', 'file_id', ...}) til en anden mappe på serversiden uden at
+    hente indholdet. Returnerer filerne med deres nye ID'er.
+    """
+    drive_service = drive_service or initialize_drive_api()
+    copies = []
+    for file in files:
+        response = drive_service.files().copy(
+            fileId=file['file_id'],
+            body={'name': file['name'], 'parents': [folder_id], 'appProperties': DRIVE_APP_PROPERTIES},
+            fields='id',
+            supportsAllDrives=True
+        ).execute(num_retries=3)
+        copies.append({**file, 'file_id': response['id']})
+    logging.info(f"Kopierede {len(copies)} filer til Drive-mappe {folder_id}")
+    return copies
+
+def list_drive_folder(drive_service, folder_id):
+    """
+    Henter de filer i en Drive-mappe, som scraperen selv har uploadet (DRIVE_APP_PROPERTIES),
+    med én pagineret listning og returnerer et indeks navn -> liste af
+    {'id', 'md5Checksum', 'mimeType'} (flere filer kan have samme navn).
+    """
+    tags = ' and '.join(
+        f"appProperties has {{ key='{key}' and value='{value}' }}" for key, value in DRIVE_APP_PROPERTIES.items()
+    )
+    index = {}
+    page_token = None
+    while True:
+        response = drive_service.files().list(
+            q=f"'{folder_id}' in parents and trashed = false and {tags}",
+            fields='nextPageToken, files(id, name, md5Checksum, mimeType)',
+            pageSize=1000,
+            pageToken=page_token,
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True
+        ).execute()
+        for item in response.get('files', []):
+            index.setdefault(item['name'], []).append(item)
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return index
+
+def file_md5(file_path):
+    """
+    Beregner MD5 af en fil i blokke; sammenlignes med Drives md5Checksum.
+    """
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def sync_files_to_drive(files, folder_id, delete_stale=True, drive_service=None, keep=()):
+    """
+    Synkroniserer filer (PageRecords) til en Drive-mappe: nye filer oprettes, ændrede
+    filer opdateres, og uændrede filer (samme MD5) springes over. Filer scraperen har uploadet
+    (mærket med DRIVE_APP_PROPERTIES), som ikke længere findes lokalt, samt dubletter med samme
+    navn slettes. Andre filer i mappen røres ikke, og det gør filer i keep heller ikke (fx
+    sider der fejlede midlertidigt i denne kørsel).
+    Tiden brugt pr. fil og udfaldet gemmes på filens record (timings['upload'], status).
+    """
+    drive_service = drive_service or initialize_drive_api()
+    index = list_drive_folder(drive_service, folder_id)
+    stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    stale = []
+
+    for file in files:
+        start = time.perf_counter()
+        existing = index.pop(file.name, [])
+        # Ældre kørsler kan have efterladt flere filer med samme navn; behold den første
+        stale.extend(existing[1:])
+        if not existing:
+            file.file_id = upload_file_to_drive(file.name, file.path, folder_id, file.mimetype, drive_service=drive_service)
+            file.status = 'created'
+        elif existing[0].get('md5Checksum') == file_md5(file.path):
+            file.file_id = existing[0]['id']
+            file.status = 'unchanged'
+        else:
+            file.file_id = upload_file_to_drive(
+                file.name, file.path, folder_id, file.mimetype, file_id=existing[0]['id'], drive_service=drive_service
+            )
+            file.status = 'updated'
+        stats[file.status] += 1
+        file.add_timings({'upload': time.perf_counter() - start})
+
+    if delete_stale:
+        for name, items in index.items():
+            if name not in keep:
+                stale.extend(items)
+        for item in stale:
+            if item.get('mimeType') not in OUTPUT_MIMETYPES:
+                continue
+            drive_service.files().delete(fileId=item['id'], supportsAllDrives=True).execute()
+            logging.info(f"Slettede forældet fil {item['name']} ({item['id']}) fra Drive")
+            stats['deleted'] += 1
+
+    logging.info(f"Drive-synkronisering færdig: {stats}")
+    return stats
+
+def upload_to_drive(file_name, file_content, folder_id, drive_service=None):
+    """
+    Upload en fil til Google Drive med retry logik og support for fællesdrev.
+    file_content kan være en streng, bytes eller en generator af strenge; en generator
+    spooles til en midlertidig fil, så hele indholdet aldrig ligger i hukommelsen.
+    """
+    if isinstance(file_content, str):
+        return upload_stream_to_drive(file_name, io.BytesIO(file_content.encode('utf-8')), folder_id,
+                                      drive_service=drive_service)
+    if isinstance(file_content, bytes):
+        return upload_stream_to_drive(file_name, io.BytesIO(file_content), folder_id, drive_service=drive_service)
+
+    with tempfile.SpooledTemporaryFile(max_size=DRIVE_CHUNK_SIZE) as stream:
+        for chunk in file_content:
+            stream.write(chunk.encode('utf-8'))
+        stream.seek(0)
+        return upload_stream_to_drive(file_name, stream, folder_id, drive_service=drive_service)
+
+
+# Delt procespulje til parsing og konvertering af HTML; oprettes ved første brug.
+# Flask kører hver async view i sin egen tråd, så oprettelsen sker under en lås
+_parse_executor = None
+_parse_executor_lock = threading.Lock()
+
+def get_parse_executor():
+    """
+    Returnerer den delte ProcessPoolExecutor. Antallet af workers styres af PARSE_WORKERS
+    (standard: antal CPU-kerner). PARSE_WORKERS=0 slår procespuljen fra.
+    """
+    global _parse_executor
+    workers = int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1))
+    if workers <= 0:
+        return None
+    with _parse_executor_lock:
+        if _parse_executor is None:
+            # 'spawn' fordi fork af en proces med kørende event loop og browser-tråde ikke er sikkert
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            logging.info(f"Startede procespulje til parsing med {workers} workers")
+        return _parse_executor
+
+# WebScraper-instanser i worker-processer, genbrugt på tværs af sider fra samme site.
+# Kun de senest brugte sites beholdes, så en langlivet worker ikke samler en scraper pr. site.
+_worker_scrapers = OrderedDict()
+WORKER_SCRAPER_CACHE_SIZE = 4
 
+def convert_html_in_worker(base_url, html, url, filepath, link_rules=None, extract_documents=True):
+    """
+    Indgang for procespuljen: konverterer én sides HTML med en WebScraper for base_url og
+    skriver Markdown direkte til filepath, så teksten ikke sendes tilbage over IPC.
+    """
+    key = (base_url, json.dumps(link_rules, sort_keys=True), extract_documents)
+    scraper = _worker_scrapers.get(key)
+    if scraper is None:
+        scraper = _worker_scrapers[key] = WebScraper(
+            base_url, parse_in_process_pool=False, link_rules=link_rules,
+            extract_documents=extract_documents
+        )
+        while len(_worker_scrapers) > WORKER_SCRAPER_CACHE_SIZE:
+            _worker_scrapers.popitem(last=False)
+    else:
+        _worker_scrapers.move_to_end(key)
+    return scraper.convert_html(html, url, filepath)
+
+def iter_pdf_pages(path, max_pages):
+    """
+    Udtrækker tekst fra en PDF side for side, så kun én side ad gangen holdes i hukommelsen.
+    """
+    reader = PdfReader(path)
+    for page_number, page in enumerate(reader.pages, start=1):
+        if page_number > max_pages:
+            logging.info(f"Stopper efter {max_pages} sider i {path}")
+            break
+        yield f"## Side {page_number}\n\n{(page.extract_text() or '').strip()}"
+
+def iter_docx_blocks(path):
+    """
+    Udtrækker afsnit og tabeller fra et Word-dokument (.docx) i dokumentets rækkefølge.
+    """
+    document = docx.Document(path)
+    for paragraph in document.paragraphs:
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        style = (paragraph.style.name or '').lower() if paragraph.style is not None else ''
+        if style.startswith('heading') and style[-1:].isdigit():
+            text = f"{'#' * min(int(style[-1]), 6)} {text}"
+        yield text
+    for table in document.tables:
+        rows = ["| " + " | ".join(cell.text.strip() for cell in row.cells) + " |" for row in table.rows]
+        if rows:
+            yield '\n'.join(rows)
+
+def extract_document_in_worker(path, kind, url, filepath, max_pages):
+    """
+    Indgang for procespuljen: udtrækker tekst fra et hentet dokument og skriver den
+    direkte til filepath blok for blok. Returnerer antal blokke og tegn samt SHA-256 af teksten.
+    """
+    if kind == 'pdf':
+        if PdfReader is None:
+            raise RuntimeError("pypdf er ikke installeret")
+        blocks = iter_pdf_pages(path, max_pages)
+    elif kind == 'docx':
+        if docx is None:
+            raise RuntimeError("python-docx er ikke installeret")
+        blocks = iter_docx_blocks(path)
+    else:
+        raise ValueError(f"Ukendt dokumenttype: {kind}")
+
+    block_count = 0
+    char_count = 0
+    digest = hashlib.sha256()
+    with open(filepath, "w", encoding="utf-8") as file:
+        header = f"URL: {url}\n"
+        file.write(header)
+        digest.update(header.encode('utf-8'))
+        for block in blocks:
+            block = "\n" + unicodedata.normalize('NFKC', CONTROL_CHARS_PATTERN.sub('', block)) + "\n"
+            file.write(block)
+            digest.update(block.encode('utf-8'))
+            block_count += 1
+            char_count += len(block) - 2
+    return {'blocks': block_count, 'chars': char_count, 'hash': digest.hexdigest()}
 
 def sanitize_and_validate_url(url):
     """
@@ -130,9 +582,747 @@ def sanitize_and_validate_url(url):
         return None
     return url.rstrip('/')  # Fjern trailing slashes for konsistens
 
+class VisitedSet:
+    """
+    Sæt af URLs til crawl-tilstand (sete, køede og gemte sider). add() tjekker og tilføjer
+    i ét kald og fortæller, om URL'en var ny. Crawlet kører i én asyncio-tråd (parse-workers
+    er processer og rører ikke sættet), så der er ingen lås; i distribueret mode bruges
+    QueueCanonicalSet i stedet.
+    """
+    def __init__(self, urls=()):
+        self._urls = set(urls)
+
+    def add(self, url):
+        """
+        Tilføjer url og returnerer True, hvis den ikke var set før.
+        """
+        if url in self._urls:
+            return False
+        self._urls.add(url)
+        return True
+
+    def discard(self, url):
+        """
+        Frigiver url igen, fx når siden der tog den ikke blev gemt alligevel.
+        """
+        self._urls.discard(url)
+
+    def __contains__(self, url):
+        return url in self._urls
+
+    def __len__(self):
+        return len(self._urls)
+
+class LinkRecord:
+    """
+    En URL i crawlets frontier: kategori ('interne'/'eksterne') og filnavnet siden gemmes under.
+    """
+    __slots__ = ('url', 'category', 'filename')
+
+    def __init__(self, url, category, filename):
+        self.url = url
+        self.category = category
+        self.filename = filename
+
+class PageRecord:
+    """
+    En side eller outputfil fra scraping til upload. Samme objekt følger siden gennem alle
+    faser og samler undervejs kanonisk URL, indholdshash, størrelse, fasetider og status
+    ('pending', 'saved', 'skipped', 'failed', 'created', 'updated', 'unchanged', 'uploaded').
+    """
+    __slots__ = ('name', 'url', 'canonical_url', 'category', 'path', 'mimetype',
+                 'content_hash', 'size', 'timings', 'status', 'file_id')
+
+    def __init__(self, name, url=None, category=None, path=None, mimetype='text/plain'):
+        self.name = name
+        self.url = url
+        self.canonical_url = None
+        self.category = category
+        self.path = path
+        self.mimetype = mimetype
+        self.content_hash = None
+        self.size = None
+        self.timings = {}
+        self.status = 'pending'
+        self.file_id = None
+
+    def add_timings(self, stages):
+        for stage, seconds in stages.items():
+            self.timings[stage] = round(self.timings.get(stage, 0.0) + seconds, 4)
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+def checkpoint_key(*parts):
+    """
+    Nøgle for et job ud fra det der bestemmer dets resultat (URL, mappe, outputformat osv.).
+    """
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class CrawlCheckpoint:
+    """
+    Varigt checkpoint for ét crawl i en sqlite-fil: frontier, færdige sider (med indhold,
+    så outputfilerne kan genskabes efter en genstart) og uploadede Drive-filer. Et job der
+    køres igen med samme nøgle fortsætter, hvor det forrige slap. Flere jobs kan dele filen.
+    """
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS jobs (job TEXT PRIMARY KEY, created REAL)",
+        "CREATE TABLE IF NOT EXISTS frontier (job TEXT, url TEXT, category TEXT, filename TEXT,"
+        " PRIMARY KEY (job, url))",
+        "CREATE TABLE IF NOT EXISTS pages (job TEXT, name TEXT, url TEXT, category TEXT, canonical_url TEXT,"
+        " status TEXT, content_hash TEXT, content BLOB, PRIMARY KEY (job, name))",
+        "CREATE TABLE IF NOT EXISTS uploads (job TEXT, name TEXT, file_id TEXT, md5 TEXT, PRIMARY KEY (job, name))",
+    )
+
+    def __init__(self, path, job_key, max_age=CHECKPOINT_MAX_AGE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.job_key = job_key
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+        created = self._query_one("SELECT created FROM jobs WHERE job = ?")
+        if created and time.time() - created[0] > max_age:
+            logging.info(f"Checkpoint for job {job_key} er for gammelt og kasseres")
+            self.clear()
+
+    def _query_one(self, sql, *params):
+        with self._lock:
+            return self._conn.execute(sql, (self.job_key, *params)).fetchone()
+
+    def _query_all(self, sql, *params):
+        with self._lock:
+            return self._conn.execute(sql, (self.job_key, *params)).fetchall()
+
+    def save_frontier(self, links):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO jobs VALUES (?, ?)", (self.job_key, time.time()))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO frontier VALUES (?, ?, ?, ?)",
+                [(self.job_key, link.url, link.category, link.filename) for link in links]
+            )
+
+    def load_frontier(self):
+        rows = self._query_all("SELECT url, category, filename FROM frontier WHERE job = ? ORDER BY rowid")
+        return [LinkRecord(url, category, filename) for url, category, filename in rows]
+
+    def save_page(self, record):
+        """
+        Markerer en side som færdig. Gemte sider får deres indhold med (zlib-komprimeret).
+        """
+        content = None
+        if record.status == 'saved' and record.path:
+            with open(record.path, 'rb') as f:
+                content = zlib.compress(f.read())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.job_key, record.name, record.url, record.category, record.canonical_url,
+                 record.status, record.content_hash, content)
+            )
+
+    def completed_pages(self):
+        """
+        Returnerer (PageRecord, indhold) for alle færdige sider; indholdet er None for sprungne sider.
+        """
+        rows = self._query_all(
+            "SELECT name, url, category, canonical_url, status, content_hash, content FROM pages WHERE job = ?"
+        )
+        for name, url, category, canonical_url, status, content_hash, content in rows:
+            record = PageRecord(name, url, category)
+            record.canonical_url = canonical_url
+            record.status = status
+            record.content_hash = content_hash
+            yield record, zlib.decompress(content) if content is not None else None
+
+    def uploaded_file(self, name):
+        """
+        Returnerer (file_id, md5) for en fil jobbet allerede har uploadet, ellers None.
+        """
+        return self._query_one("SELECT file_id, md5 FROM uploads WHERE job = ? AND name = ?", name)
+
+    def save_upload(self, name, file_id, md5):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?)", (self.job_key, name, file_id, md5))
+
+    def clear(self):
+        with self._lock, self._conn:
+            for table in ('jobs', 'frontier', 'pages', 'uploads'):
+                self._conn.execute(f"DELETE FROM {table} WHERE job = ?", (self.job_key,))
+
+    def close(self):
+        self._conn.close()
+
+class WorkQueue:
+    """
+    Delt arbejdskø for distribueret crawl i en sqlite-fil, som coordinator og workers
+    (processer eller containere med samme volumen) tilgår. Køen står for dedupe og status
+    centralt: hver URL køes kun én gang pr. job, hver kanonisk URL kan kun gemmes én gang,
+    og en opgave hvis lease udløber (fx fordi workeren døde) gives til en anden worker.
+    """
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS jobs (job TEXT PRIMARY KEY, base_url TEXT, folder_id TEXT, options TEXT,"
+        " status TEXT, created REAL, finished REAL)",
+        "CREATE TABLE IF NOT EXISTS tasks (job TEXT, url TEXT, category TEXT, filename TEXT, status TEXT,"
+        " worker TEXT, lease_until REAL, attempts INTEGER DEFAULT 0, file_id TEXT, PRIMARY KEY (job, url))",
+        "CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until)",
+        "CREATE TABLE IF NOT EXISTS canonicals (job TEXT, canonical_url TEXT, PRIMARY KEY (job, canonical_url))",
+    )
+    FINAL_STATUSES = ('saved', 'skipped', 'failed')
+
+    def __init__(self, path, lease_seconds=WORK_LEASE_SECONDS, max_attempts=WORK_MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._transaction() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE tager skrivelåsen med det samme, så to workers ikke leaser samme opgave
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def create_job(self, job_id, base_url, folder_id, options):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs VALUES (?, ?, ?, ?, 'running', ?, NULL)",
+                (job_id, base_url, folder_id, json.dumps(options), time.time())
+            )
+
+    def job(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT base_url, folder_id, options, status, created, finished FROM jobs WHERE job = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        base_url, folder_id, options, status, created, finished = row
+        return {'job_id': job_id, 'base_url': base_url, 'folder_id': folder_id, 'options': json.loads(options),
+                'status': status, 'created': created, 'finished': finished}
+
+    def enqueue(self, job_id, links):
+        """
+        Køer links (LinkRecords) for jobbet. URLs der allerede er i køen springes over.
+        Returnerer antallet af nye opgaver.
+        """
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (job, url, category, filename, status) VALUES (?, ?, ?, ?, 'queued')",
+                [(job_id, link.url, link.category, link.filename) for link in links]
+            )
+            return conn.total_changes - before
+
+    def expire_leases(self):
+        """
+        Giver op på opgaver hvis lease er udløbet efter for mange forsøg, og markerer dem
+        som fejlede. Returnerer de berørte jobs, så de kan afsluttes med finish_job.
+        """
+        now = time.time()
+        expired = "status = 'leased' AND lease_until < ? AND attempts >= ?"
+        with self._transaction() as conn:
+            job_ids = {row[0] for row in conn.execute(
+                f"SELECT DISTINCT job FROM tasks WHERE {expired}", (now, self.max_attempts)
+            )}
+            conn.execute(f"UPDATE tasks SET status = 'failed' WHERE {expired}", (now, self.max_attempts))
+        return job_ids
+
+    def lease(self, worker_id, limit):
+        """
+        Giver op til limit ventende opgaver (eller opgaver med udløbet lease) til workeren.
+        Returnerer en liste af (job_id, LinkRecord).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # Opgaver der er forsøgt for mange gange, gives op i expire_leases
+            rows = conn.execute(
+                "SELECT rowid, job, url, category, filename FROM tasks WHERE status = 'queued'"
+                " OR (status = 'leased' AND lease_until < ? AND attempts < ?) ORDER BY rowid LIMIT ?",
+                (now, self.max_attempts, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE rowid = ?",
+                [(worker_id, now + self.lease_seconds, row[0]) for row in rows]
+            )
+        return [(job_id, LinkRecord(url, category, filename)) for _, job_id, url, category, filename in rows]
+
+    def complete(self, job_id, url, status, file_id=None):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = ?, file_id = ?, lease_until = NULL WHERE job = ? AND url = ?",
+                (status, file_id, job_id, url)
+            )
+
+    def fail(self, job_id, url):
+        """
+        Sætter en fejlet opgave tilbage i køen, eller markerer den som fejlet efter for mange forsøg.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,"
+                " lease_until = NULL WHERE job = ? AND url = ?",
+                (self.max_attempts, job_id, url)
+            )
+
+    def claim_canonical(self, job_id, canonical_url):
+        """
+        Returnerer True, hvis ingen anden worker har gemt en side med denne kanoniske URL.
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO canonicals VALUES (?, ?)", (job_id, canonical_url))
+            return cursor.rowcount == 1
+
+    def release_canonical(self, job_id, canonical_url):
+        """
+        Frigiver en kanonisk URL, hvis siden der tog den ikke blev gemt, så et nyt forsøg
+        (eller et alias) kan gemme den.
+        """
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM canonicals WHERE job = ? AND canonical_url = ?", (job_id, canonical_url))
+
+    def progress(self, job_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE job = ? GROUP BY status", (job_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def finish_job(self, job_id):
+        """
+        Markerer jobbet som færdigt, når ingen opgaver venter. Returnerer True for præcis
+        det kald der afsluttede jobbet, så afsluttende arbejde kun udføres én gang.
+        """
+        with self._transaction() as conn:
+            placeholders = ', '.join('?' * len(self.FINAL_STATUSES))
+            pending = conn.execute(
+                f"SELECT COUNT(*) FROM tasks WHERE job = ? AND status NOT IN ({placeholders})",
+                (job_id, *self.FINAL_STATUSES)
+            ).fetchone()[0]
+            if pending:
+                return False
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'done', finished = ? WHERE job = ? AND status = 'running'",
+                (time.time(), job_id)
+            )
+            return cursor.rowcount == 1
+
+    def close(self):
+        self._conn.close()
+
+class ResultCache:
+    """
+    Cache af færdige crawls i en sqlite-fil, nøglet på sitets kanoniske base-URL og de
+    valgmuligheder der bestemmer outputtet. Inden for ttl sekunder genbruges de Drive-filer
+    det forrige crawl producerede, i stedet for at sitet crawles igen.
+    """
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, base_url TEXT, folder_id TEXT,"
+              " files TEXT, created REAL)")
+
+    def __init__(self, path, ttl=RESULT_CACHE_TTL):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(self.SCHEMA)
+
+    def get(self, key):
+        """
+        Returnerer {'base_url', 'folder_id', 'files', 'created'} for et friskt resultat, ellers None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT base_url, folder_id, files, created FROM results WHERE key = ? AND created >= ?",
+                (key, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        base_url, folder_id, files, created = row
+        return {'base_url': base_url, 'folder_id': folder_id, 'files': json.loads(files), 'created': created}
+
+    def put(self, key, base_url, folder_id, files):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (key, base_url, folder_id, json.dumps(files), time.time())
+            )
+
+    def invalidate(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def close(self):
+        self._conn.close()
+
+def reuse_cached_result(cache, key, cached, base_url, folder_id, drive_service=None):
+    """
+    Leverer et cachet resultat til folder_id: ligger filerne allerede i mappen, genbruges de
+    som de er, ellers kopieres de dertil. Returnerer svaret til /scrape, eller None hvis de
+    cachede filer ikke længere findes i Drive (cacheposten fjernes da).
+    """
+    drive_service = drive_service or initialize_drive_api()
+    if cached['folder_id'] == folder_id:
+        # Filerne kan være slettet eller lagt i papirkurven siden; listningen udelader begge
+        present = {item['id'] for items in list_drive_folder(drive_service, folder_id).values() for item in items}
+        if any(file['file_id'] not in present for file in cached['files']):
+            logging.warning(f"Cachede filer for {base_url} findes ikke længere i mappen; crawler igen")
+            cache.invalidate(key)
+            return None
+        files = cached['files']
+        files_uploaded = 0
+    else:
+        try:
+            files = copy_drive_files(cached['files'], folder_id, drive_service)
+        except HttpError as e:
+            logging.warning(f"Cachet resultat for {base_url} kunne ikke kopieres ({e}); crawler igen")
+            cache.invalidate(key)
+            return None
+        files_uploaded = len(files)
+    logging.info(f"Genbruger resultat for {base_url} fra {datetime.utcfromtimestamp(cached['created']).isoformat()}Z")
+    return {
+        'url': base_url,
+        'files_uploaded': files_uploaded,
+        'status': 'success',
+        'cached': {
+            'age_seconds': round(time.time() - cached['created'], 1),
+            'source_folder_id': cached['folder_id'],
+            'files': files,
+        },
+    }
+
+class QueueCanonicalSet:
+    """
+    Bruges som WebScraper.saved_canonical_urls i distribueret mode, så dedupe af
+    kanoniske URLs sker i den delte kø på tværs af workers.
+    """
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+
+    def add(self, url):
+        return self.queue.claim_canonical(self.job_id, url)
+
+    def discard(self, url):
+        self.queue.release_canonical(self.job_id, url)
+
+class PageContext:
+    """
+    Tilstand for konverteringen af én side: URL, sete afsnit og linkindeks.
+    Følger med ned gennem process_element i stedet for at ligge på WebScraper-instansen, så
+    flere sider kan konverteres samtidig i tråde eller processer uden at dele dedupe-tilstand.
+    """
+    __slots__ = ('url', 'seen_paragraphs', 'link_index')
+
+    def __init__(self, url, link_index=None):
+        self.url = url
+        self.seen_paragraphs = set()
+        self.link_index = link_index
+
+class ByteBudget:
+    """
+    Asynkron grænse for hvor mange bytes HTML der er under behandling på én gang på tværs
+    af sider. En side der alene er større end budgettet får lov, når intet andet er i gang,
+    så et crawl aldrig går i stå.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self._condition = asyncio.Condition()
+
+    def _add(self, size):
+        self.used += size
+        self.peak = max(self.peak, self.used)
+
+    async def acquire(self, size):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self._add(size)
+
+    async def resize(self, old_size, new_size):
+        """
+        Justerer en reservation til den faktiske størrelse uden at vente; HTML'en er
+        allerede hentet, når størrelsen kendes.
+        """
+        async with self._condition:
+            self._add(new_size - old_size)
+            if new_size < old_size:
+                self._condition.notify_all()
+
+    async def release(self, size):
+        async with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+def rss_bytes(pid='self'):
+    """
+    Aktuel RSS for en proces i bytes fra /proc, eller None hvor /proc ikke findes.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def build_http_session(pool_maxsize):
+    """
+    Opretter en `requests.Session` med Retry og HTTPAdapter for fejlhåndtering og genforsøg.
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retries = CountingRetry(
+        total=2,  # Antal forsøg; pre-flight må ikke forsinke crawlet meget
+        backoff_factor=0.5,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=["HEAD", "GET", "OPTIONS"]
+    )
+    adapter = HTTPAdapter(max_retries=retries, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class FairScheduler:
+    """
+    Fordeler et fælles antal sideslots mellem flere sites i round-robin, så et stort site
+    ikke udsulter de andre i en batch. Bruges som `async with scheduler.slot(site):`.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._waiters = {}  # site -> kø af ventende futures
+        self._turns = deque()  # sites med ventende sider, i tur-rækkefølge
+
+    async def acquire(self, site):
+        if self.active < self.limit and not self._turns:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(site, deque())
+        if not waiters:
+            self._turns.append(site)
+        waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Slottet nåede at blive givet videre til os; giv det til den næste
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        # Giv slottet direkte videre til det næste site i rækken
+        while self._turns:
+            site = self._turns.popleft()
+            waiters = self._waiters[site]
+            future = waiters.popleft()
+            if waiters:
+                self._turns.append(site)
+            else:
+                del self._waiters[site]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def slot(self, site):
+        return _SchedulerSlot(self, site)
+
+class _SchedulerSlot:
+    def __init__(self, scheduler, site):
+        self.scheduler = scheduler
+        self.site = site
+
+    async def __aenter__(self):
+        await self.scheduler.acquire(self.site)
+
+    async def __aexit__(self, *exc_info):
+        self.scheduler.release()
+
+class SharedPools:
+    """
+    Ressourcer der deles af alle sites i en batch: én browser, én HTTP-session, én
+    Drive-klient og en FairScheduler for det samlede antal samtidige sider.
+    Browseren og Drive-klienten oprettes først, når de skal bruges. Drive-klienten er ikke
+    trådsikker, så den ejes af én Drive-tråd, som alle Drive-kald køres på (se drive()).
+    """
+    def __init__(self, max_concurrent_pages):
+        self.session = build_http_session(max_concurrent_pages)
+        self.scheduler = FairScheduler(max_concurrent_pages)
+        self._drive_service = None
+        self._drive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='drive')
+        self._playwright = None
+        self._browser = None
+        self._browser_lock = asyncio.Lock()
+
+    def drive_service(self):
+        if self._drive_service is None:
+            self._drive_service = initialize_drive_api()
+        return self._drive_service
+
+    async def drive(self, function, *args, **kwargs):
+        """
+        Kører function(*args, drive_service=..., **kwargs) på Drive-tråden, så uploads
+        ikke blokerer event loopet for de andre sites i batchen.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._drive_executor, functools.partial(self._call_drive, function, args, kwargs)
+        )
+
+    def _call_drive(self, function, args, kwargs):
+        return function(*args, drive_service=self.drive_service(), **kwargs)
+
+    async def get_browser(self):
+        async with self._browser_lock:
+            if self._browser is None:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+                ACTIVE_BROWSERS.inc()
+            return self._browser
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+            ACTIVE_BROWSERS.dec()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        self.session.close()
+        self._drive_executor.shutdown(wait=True)
+
+class StageTimer:
+    """
+    Måler tid pr. fase for én side eller ét job. lap(fase) tilskriver tiden siden forrige
+    lap (eller reset) til fasen; samme fase kan måles flere gange og lægges sammen.
+    """
+    def __init__(self):
+        self.stages = {}
+        self._last = time.perf_counter()
+
+    def reset(self):
+        self._last = time.perf_counter()
+
+    def elapsed(self):
+        """
+        Tid siden forrige lap eller reset, uden at registrere den.
+        """
+        return time.perf_counter() - self._last
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.add(stage, now - self._last)
+        self._last = now
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def merge(self, stages):
+        for stage, seconds in stages.items():
+            self.add(stage, seconds)
+
+    def as_dict(self):
+        return {stage: round(seconds, 4) for stage, seconds in self.stages.items()}
+
+class LinkFilter:
+    """
+    Forudkompileret filter til is_relevant_link. Linket gøres til små bogstaver én gang;
+    stifragmenter matches med ét samlet regex, og filendelsen slås op i et sæt.
+
+    Kundespecifikke regler:
+    - include: fragmenter hvoraf mindst ét skal forekomme, for at linket er relevant
+    - exclude: ekstra fragmenter der udelukker linket
+    - allow_extensions: ekstra filendelser der behandles som sider (fx '.php')
+
+    Dokumenter (document_extensions) undtages fra excluded_paths, da PDF- og Word-filer typisk
+    ligger under asset-stier som /wp-content/uploads/; kundens exclude-regler gælder stadig.
+    """
+    def __init__(self, excluded_paths, excluded_extensions, include=(), exclude=(), allow_extensions=(),
+                 document_extensions=()):
+        self.excluded_extensions = frozenset(ext.lower() for ext in excluded_extensions)
+        self.document_extensions = frozenset(ext.lower() for ext in document_extensions)
+        self.allowed_extensions = frozenset(('', '.html', '.htm', *(ext.lower() for ext in allow_extensions),
+                                             *self.document_extensions))
+        self.asset_path_pattern = self._compile(excluded_paths)
+        self.excluded_pattern = self._compile(exclude)
+        self.include_pattern = self._compile(include)
+
+    @staticmethod
+    def _compile(fragments):
+        if not fragments:
+            return None
+        return re.compile('|'.join(re.escape(fragment.lower()) for fragment in fragments))
+
+    def check(self, link):
+        """
+        Returnerer (relevant, årsag). Årsagen bruges kun til logning af udelukkede links.
+        """
+        lowered = link.lower()
+        extension = os.path.splitext(urlsplit(lowered).path)[1]
+        if self.excluded_pattern and self.excluded_pattern.search(lowered):
+            return False, "sti"
+        if (self.asset_path_pattern and extension not in self.document_extensions
+                and self.asset_path_pattern.search(lowered)):
+            return False, "sti"
+        if self.include_pattern and not self.include_pattern.search(lowered):
+            return False, "include-regler"
+
+        if extension in self.allowed_extensions:
+            return True, None
+        if extension in self.excluded_extensions:
+            return False, "filendelse"
+        return False, "ukendt filendelse"
+
+def load_link_rules(base_url, overrides=None):
+    """
+    Henter kundespecifikke linkregler. LINK_RULES_FILE kan pege på en JSON-fil med regler
+    pr. domæne (uden www.) og evt. en "default"-nøgle, fx:
+        {"default": {"exclude": ["/kurv"]}, "kunde.dk": {"include": ["/produkter"]}}
+    Regler fra requesten (overrides) lægges oven i filens regler.
+    """
+    rules = {}
+    rules_file = os.environ.get("LINK_RULES_FILE")
+    if rules_file:
+        try:
+            with open(rules_file, 'r', encoding='utf-8') as f:
+                all_rules = json.load(f)
+            host = (urlsplit(base_url).hostname or '').removeprefix('www.')
+            rules = dict(all_rules.get(host, all_rules.get("default", {})))
+        except Exception as e:
+            logging.error(f"Fejl ved indlæsning af linkregler fra {rules_file}: {e}")
+
+    overrides = overrides or {}
+    if not isinstance(overrides, dict):
+        raise ValueError("link_rules skal være et objekt med lister af strenge")
+    for key, values in overrides.items():
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise ValueError(f"Linkreglen '{key}' skal være en liste af strenge")
+        rules[key] = [*rules.get(key, []), *values]
+
+    unknown = set(rules) - {'include', 'exclude', 'allow_extensions'}
+    if unknown:
+        raise ValueError(f"Ukendte linkregler: {', '.join(sorted(unknown))}")
+    return rules
+
 class WebScraper:
-    def __init__(self, base_url):
-        self.base_url = base_url.rstrip('/')
+    def __init__(self, base_url, boilerplate_threshold=0.6, parse_in_process_pool=True,
+                 collapse_canonical_aliases=True, link_rules=None, preflight=True,
+                 extract_documents=True, memory_budget_mb=None, checkpoint=None, pools=None,
+                 output_dir=None):
+        self.base_url = canonicalize_url(base_url.rstrip('/'))
 
         self.headers = HEADERS
 
@@ -157,6 +1347,30 @@ class WebScraper:
             # Andre relevante filtypenavne
         ]
 
+        # Stier der indeholder disse fragmenter er assets og ikke indholdssider
+        self.excluded_paths = [
+            '/wp-content/',
+            '/wp-includes/',
+            '/uploads/',
+            '/plugins/',
+            '/themes/',
+            '/css/',
+            '/js/',
+            '/images/',
+            '/assets/',
+            '/cdn-cgi/',
+            '/fonts/',
+        ]
+
+        # Forudkompileret linkfilter med eventuelle kundespecifikke regler
+        self.link_rules = link_rules if link_rules is not None else load_link_rules(self.base_url)
+        # PDF- og Word-filer hentes uden browser og udtrækkes som tekst (se scrape_document)
+        self.extract_documents = extract_documents
+        self.link_filter = LinkFilter(
+            self.excluded_paths, self.excluded_extensions, **self.link_rules,
+            document_extensions=DOCUMENT_EXTENSIONS if extract_documents else ()
+        )
+
         # Specifikke lister over klassenavne og ID'er for uønskede elementer
         self.unwanted_selectors = [
             '.cookie-banner',
@@ -226,7 +1440,7 @@ class WebScraper:
         ]
 
         # Opret hovedmappe til outputfiler (brug midlertidige mapper i Cloud Run)
-        self.output_dir = "/tmp/webscraping"
+        self.output_dir = output_dir or "/tmp/webscraping"
         os.makedirs(self.output_dir, exist_ok=True)
 
         # Opret separate mapper for interne og eksterne links
@@ -235,8 +1449,54 @@ class WebScraper:
         os.makedirs(self.internal_output_dir, exist_ok=True)
         os.makedirs(self.external_output_dir, exist_ok=True)
 
-        # Sæt til at holde styr på allerede sete afsnit
-        self.seen_paragraphs = set()
+        # Afsnit der går igen på mere end denne andel af siderne betragtes som boilerplate
+        # (header, menu, footer, cookietekst). Sæt til None for at slå detektionen fra.
+        self.boilerplate_threshold = boilerplate_threshold
+        # Under dette antal sider er der for lidt data til at skelne boilerplate fra indhold
+        self.boilerplate_min_pages = 4
+
+        # Kør parsing og Markdown-konvertering i den delte procespulje i stedet for på event loopet
+        self.parse_in_process_pool = parse_in_process_pool
+        # Antal sider der hentes samtidig (uafhængigt af antallet af parse-workers)
+        self.max_concurrent_pages = int(os.environ.get("MAX_CONCURRENT_PAGES", 10))
+
+        # Sider hvis <link rel="canonical"> peger på en allerede gemt side gemmes ikke igen
+        self.collapse_canonical_aliases = collapse_canonical_aliases
+
+        # Hukommelsesbudget: maks. MB HTML under behandling på én gang (None = ubegrænset)
+        if memory_budget_mb is None and os.environ.get("MEMORY_BUDGET_MB"):
+            memory_budget_mb = float(os.environ["MEMORY_BUDGET_MB"])
+        self.html_budget = ByteBudget(int(memory_budget_mb * 1024 * 1024)) if memory_budget_mb else None
+        # Gennemsnitlig sidestørrelse bruges som reservation, før en side er hentet
+        self.fetched_pages = 0
+        self.fetched_bytes = 0
+        # Højeste RSS målt under run() for hovedprocessen og (samlet) for parse-workers
+        self.peak_rss = 0
+        self.peak_worker_rss = 0
+
+        # PageRecord pr. side og outputfil (nøgle: filnavn) samt fasetider for jobbet som helhed
+        self.pages = {}
+        # CrawlCheckpoint at gemme fremdrift i og genoptage fra (None = ingen checkpoints)
+        self.checkpoint = checkpoint
+        self.resumed_pages = 0
+        self.job_timer = StageTimer()
+
+        # Crawl-tilstand holdes i VisitedSets frem for i is_relevant_link
+        self.enqueued_urls = VisitedSet()
+        self.saved_canonical_urls = VisitedSet()
+
+        # Tjek Content-Type og størrelse med HEAD før en side åbnes i browseren
+        self.preflight = preflight
+        # Sider større end dette (i bytes) renderes ikke
+        self.max_page_bytes = int(os.environ.get("MAX_PAGE_BYTES", 10 * 1024 * 1024))
+        # Grænser for dokumenter: størrelse på download og antal PDF-sider der udtrækkes
+        self.max_document_bytes = int(os.environ.get("MAX_DOCUMENT_BYTES", 25 * 1024 * 1024))
+        self.max_document_pages = int(os.environ.get("MAX_DOCUMENT_PAGES", 200))
+
+        # Delte ressourcer (browser, HTTP-session, Drive-klient, sideslots) ved batch-jobs
+        self.pools = pools
+        # Opret en `requests.Session` for vedvarende forbindelser
+        self.session = pools.session if pools else build_http_session(self.max_concurrent_pages)
 
     def remove_html_comments_from_soup(self, soup):
         """
@@ -246,20 +1506,15 @@ class WebScraper:
             comment.extract()
         return soup
 
-    def remove_image_lines(self, text):
-        lines = text.splitlines()
-        filtered_lines = [line for line in lines if "![](" not in line]
-        return "\n".join(filtered_lines)
-
     def clean_and_normalize(self, text):
         """
         Rens og normaliser tekst ved at fjerne uønskede tegn og normalisere Unicode.
         """
-        # Fjern zero-width space og andre kontroltegn
-        text = re.sub(r'[\u200B-\u200D\uFEFF]', '', text)
-        # Fjern andre uønskede kontroltegn, men bevare \n og \r
-        text = re.sub(r'[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]', '', text)
-        # Normaliser Unicode
+        # Fjern zero-width space og andre kontroltegn, men bevar \n og \r
+        text = CONTROL_CHARS_PATTERN.sub('', text)
+        # Normaliser Unicode (ren ASCII er allerede NFKC-normaliseret)
+        if text.isascii():
+            return text
         return unicodedata.normalize('NFKC', text)
 
     def sanitize_filename(self, link):
@@ -300,226 +1555,621 @@ class WebScraper:
         )
         return url_pattern.findall(text)
     
-    def remove_duplicate_paragraphs(self, text):
-        paragraphs = text.split('\n\n')
-        unique_paragraphs = []
-        seen = set()
+    def iter_paragraphs(self, text):
+        """
+        Gennemløber teksten afsnit for afsnit uden at splitte hele dokumentet på én gang.
+        """
+        start = 0
+        while True:
+            end = text.find('\n\n', start)
+            if end == -1:
+                yield text[start:]
+                return
+            yield text[start:end]
+            start = end + 2
 
+    def dedupe_paragraphs(self, paragraphs):
+        """
+        Generator der springer tomme og allerede sete afsnit over.
+        """
+        seen = set()
         for para in paragraphs:
             # Trim hvidrum og normaliser afsnittet
             para_clean = self.clean_and_normalize(para.strip())
-            # Hvis afsnittet ikke er tomt og ikke er set før, tilføj det
+            # Hvis afsnittet ikke er tomt og ikke er set før, send det videre
             if para_clean and para_clean not in seen:
-                unique_paragraphs.append(para)
                 seen.add(para_clean)
+                yield para
             else:
                 logging.info(f"Fjerner gentaget afsnit: {para[:30]}...")
 
-        return '\n\n'.join(unique_paragraphs)
+    def dedupe_sentences(self, paragraphs):
+        """
+        Generator der fjerner konsekutive gentagelser af sætninger, også på tværs af afsnit.
+        """
+        previous_sentence = ""
+        for para in paragraphs:
+            lines = []
+            for line in para.split('\n'):
+                # Del linjen i sætninger ved hjælp af punktum som separator
+                clean_sentences = []
+                for sentence in SENTENCE_SPLIT_PATTERN.split(line.strip()):
+                    sentence = sentence.strip()
+                    if sentence and sentence != previous_sentence:
+                        clean_sentences.append(sentence)
+                        previous_sentence = sentence
+                lines.append(". ".join(clean_sentences))
+            yield '\n'.join(lines)
+
+    def clean_paragraph(self, para):
+        """
+        Fjerner billedlinjer, uønsket tekst, tomme links og kontroltegn fra ét afsnit og
+        normaliserer teksten.
+        """
+        # Billedlinjer fjernes før regex'et, så "![](...)" ikke bliver til et løst "!"
+        if "![](" in para:
+            para = '\n'.join(line for line in para.split('\n') if "![](" not in line)
+        lowered = para.lower()
+        if any(phrase in lowered for phrase in UNWANTED_TEXT):
+            para = UNWANTED_TEXT_PATTERN.sub('', para)
+        if "[](" in para:
+            para = EMPTY_LINK_PATTERN.sub('', para)
+        return self.clean_and_normalize(para)
+
+    def postprocess_paragraphs(self, body_text, links_text=''):
+        """
+        Samlet efterbehandling i ét gennemløb pr. afsnit: hvert afsnit renses (clean_paragraph),
+        gentagne afsnit i brødteksten springes over (dedupe_paragraphs, efter rensningen), og
+        konsekutivt gentagne sætninger fjernes på tværs af brødtekst og linksektion (dedupe_sentences).
+        """
+        body = self.dedupe_paragraphs(self.clean_paragraph(para) for para in self.iter_paragraphs(body_text))
+        links = (self.clean_paragraph(para) for para in self.iter_paragraphs(links_text))
+        for para in self.dedupe_sentences(itertools.chain(body, links)):
+            if para.strip():
+                yield para
+
+    def build_link_index(self, soup, page_url, extra_urls=()):
+        """
+        Gennemløber sidens <a href>-tags én gang og returnerer et linkindeks:
+        'by_url' har ét opslag pr. unikt link (uden fragment) med ankertekst, intern/ekstern
+        og relevans; 'by_element' giver den opløste href for hvert <a>-tag til process_element.
+        """
+        base_netloc = urlparse(self.base_url).netloc.replace('www.', '')
+        by_url = {}
+        by_element = {}
+
+        def add(href, text):
+            link = canonicalize_url(href, self.base_url)
+            if not link or link in by_url:
+                return
+            parsed = urlparse(link)
+            by_url[link] = {
+                'url': link,
+                'text': text,
+                'internal': parsed.netloc.replace('www.', '') == base_netloc,
+                # Kun http(s)-links kan scrapes; mailto:, tel: osv. er aldrig relevante
+                'relevant': parsed.scheme in ('http', 'https') and self.is_relevant_link(link),
+            }
+
+        for link_tag in soup.find_all('a', href=True):
+            href = link_tag['href'].strip()
+            if not href:
+                continue
+            # Relative og schema-relative URLs gøres absolutte ud fra siden
+            href = urljoin(page_url, href)
+            by_element[id(link_tag)] = href
+            add(href, link_tag.get_text(strip=True))
+
+        for href in extra_urls:
+            add(href, '')
+
+        return {'by_url': by_url, 'by_element': by_element}
+
+    def convert_html(self, html, url, filepath):
+        """
+        Den CPU-tunge del af scrape_page: parser HTML, fjerner uønskede elementer, konverterer
+        til Markdown, efterbehandler teksten og skriver den til filepath. Kan køre i en worker-proces.
+        Returnerer et dict med filens størrelse og SHA-256, interne og eksterne links samt
+        sidens kanoniske URL.
+        """
+        timer = StageTimer()
+
+        # Ekstrakter Calendly URLs før parsing med BeautifulSoup
+        calendly_urls = self.extract_calendly_urls(html)
+        logging.info(f"Fundet {len(calendly_urls)} Calendly URL(s) i {url}")
+
+        # Parse HTML
+        soup = BeautifulSoup(html, "html.parser")
+        timer.lap('parse')
+        soup = self.remove_html_comments_from_soup(soup)
+        logging.info(f"Parsed HTML for: {url}")
+
+        # Fjern uønskede elementer baseret på specifikke CSS-selektorer
+        for selector in self.unwanted_selectors:
+            removed_elements = soup.select(selector)
+            if removed_elements:
+                logging.info(f"Fjernede {len(removed_elements)} elementer med selector '{selector}'")
+            for element in removed_elements:
+                element.decompose()
+
+        # Fjern <script> og <style> tags for at undgå JavaScript i outputtet
+        removed_scripts = soup(['script', 'style'])
+        logging.info(f"Fjernede {len(removed_scripts)} <script>/<style> tags")
+        for script_or_style in removed_scripts:
+            script_or_style.decompose()
+        timer.lap('prune')
+
+        # Byg sidens linkindeks én gang; det bruges både af process_element og til linksektionen
+        link_index = self.build_link_index(soup, url, extra_urls=calendly_urls)
+
+        # Find alle produktsektioner
+        # Opdater denne selector til at matche dine produktcontainere
+        product_sections = soup.find_all('div', class_='product-item')  # Tilpas 'product-item' til dit website
+
+        formatted_text = f"URL: {url}\n\n"
+
+        if product_sections:
+            logging.info(f"Fundet {len(product_sections)} produktsektioner")
+            for idx, product in enumerate(product_sections, 1):
+                product_info = self.extract_product_info(product, url)
+                if product_info:
+                    formatted_text += f"### Produkt {idx}\n\n"
+                    formatted_text += product_info
+                    formatted_text += "\n---\n\n"
+        else:
+            logging.info("Ingen produktsektioner fundet, bruger process_element")
+            # Hvis ingen produkter findes, brug den eksisterende process_element funktion
+            body = soup.find('body')
+            if body:
+                context = PageContext(url, link_index)
+                formatted_text += self.process_element(body, context=context)
+
+        logging.info(f"Formatted text for {url}:\n{formatted_text[:500]}")  # Log de første 500 tegn
+
+        # Kategoriser links fra linkindekset
+        internal_links_set = set()
+        external_links_set = set()
+
+        # Always add base_url to internal links
+        internal_links_set.add(self.base_url)
+
+        for link, entry in link_index['by_url'].items():
+            if link == self.base_url or not entry['relevant']:
+                continue
+            if entry['internal']:
+                internal_links_set.add(link)
+            else:
+                external_links_set.add(link)
+
+        # Byg sektionen med interne links
+        links_text = ''
+        if internal_links_set:
+            links_text += "### Interne Links\n\n"
+            for internal_link in sorted(internal_links_set):  # Sorter links for konsistens
+                if internal_link.rstrip('/') == self.base_url.rstrip('/'):
+                    # Special handling for base URL to show as "Forside"
+                    links_text += f"- [Forside]({internal_link})\n"
+                else:
+                    links_text += f"- [{internal_link}]({internal_link})\n"
 
+        # Sidens egen kanoniske URL, hvis den angiver en
+        canonical_url = None
+        canonical_tag = soup.find('link', rel='canonical', href=True)
+        if canonical_tag and canonical_tag['href'].strip():
+            canonical_url = canonicalize_url(urljoin(url, canonical_tag['href'].strip()), self.base_url)
+
+        # Frigiv træet med det samme i stedet for at vente på garbage collectoren
+        soup.decompose()
+        timer.lap('convert')
+
+        # Efterbehandlede afsnit skrives efterhånden som de dannes, i ét gennemløb
+        size = 0
+        digest = hashlib.sha256()
+        try:
+            with open(filepath, "wb") as file:
+                for idx, para in enumerate(self.postprocess_paragraphs(formatted_text, links_text)):
+                    chunk = (f"\n\n{para}" if idx else para).encode('utf-8')
+                    file.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                file.write(b"\n")
+                digest.update(b"\n")
+                size += 1
+        except Exception as e:
+            logging.error(f"Fejl ved skrivning til fil: {filepath} ({e})", exc_info=True)
+            raise
+        del formatted_text
+        logging.info(f"Indhold gemt i '{filepath}' for URL: {url}")
+        timer.lap('postprocess')
+        return {
+            'size': size,
+            'hash': digest.hexdigest(),
+            'internal_links': internal_links_set,
+            'external_links': external_links_set,
+            'canonical_url': canonical_url,
+            'timings': timer.as_dict(),
+        }
 
     async def scrape_page(self, url, filename, category):
         """
         Scraper en enkelt side og gemmer indholdet i den angivne kategori-mappe.
+        Returnerer sidens PageRecord.
         """
+        record = self.page_record(filename, url, category)
+        timer = StageTimer()
+        info = None
+        reserved = 0
         try:
             logging.info(f"Starter scraping af: {url} (Kategori: {category})")
-            html = await self.get_page_source_with_playwright(url)
+            loop = asyncio.get_running_loop()
+
+            # Pre-flight: spring ikke-HTML og for store ressourcer over før en browser startes
+            if self.preflight:
+                info = await loop.run_in_executor(None, self.fetch_headers, url)
+                timer.lap('preflight')
+                action, reason = self.classify_response(info)
+                if action == 'skip':
+                    logging.info(f"Springer {url} over efter pre-flight: {reason}")
+                    return record
+                if action == 'fail':
+                    logging.warning(f"Pre-flight fejlede for {url}: {reason}")
+                    record.status = 'failed'
+                    return record
+                if action == 'document':
+                    await self.scrape_document(url, filename, category, reason, timer)
+                    return record
+            elif self.document_kind(url):
+                await self.scrape_document(url, filename, category, self.document_kind(url), timer)
+                return record
+
+            # Reserver plads i hukommelsesbudgettet før browseren henter siden
+            if self.html_budget:
+                estimate = self.estimate_page_bytes(info)
+                await self.html_budget.acquire(estimate)
+                # Først nu er pladsen vores; afbrydes ventetiden, er der intet at frigive
+                reserved = estimate
+                timer.lap('budget_wait')
+
+            html = await self.get_page_source_with_playwright(url, timer)
 
             if not html:
+                # Timeout eller fejl i browseren: siden findes måske stadig og skal prøves igen
                 logging.warning(f"Tom eller ugyldig HTML-indhold for: {url}")
-                return
+                record.status = 'failed'
+                return record
+
+            # Budgettet og Content-Length regnes i bytes (UTF-8), ikke i tegn
+            html_bytes = len(html.encode('utf-8'))
+            self.fetched_pages += 1
+            self.fetched_bytes += html_bytes
+            if self.html_budget:
+                await self.html_budget.resize(reserved, html_bytes)
+                reserved = html_bytes
+
+            # Parsing og konvertering køres i procespuljen, så event loopet kan fortsætte med at hente sider
+            # Konverteringen skriver selv filen i mappen for kategorien
+            filepath = self.output_path(category, filename)
+            timer.reset()
+            executor = get_parse_executor() if self.parse_in_process_pool else None
+            if executor:
+                result = await loop.run_in_executor(
+                    executor, convert_html_in_worker, self.base_url, html, url, filepath,
+                    self.link_rules, self.extract_documents
+                )
+            else:
+                result = self.convert_html(html, url, filepath)
+            # HTML'en er konverteret; slip den og pladsen i budgettet før filen skrives
+            html = None
+            if self.html_budget:
+                await self.html_budget.release(reserved)
+                reserved = 0
+            # Tid brugt i kø og på at sende HTML til/fra workeren, ud over selve konverteringen
+            roundtrip = timer.elapsed()
+            timer.add('queue', max(0.0, roundtrip - sum(result['timings'].values())))
+            timer.merge(result['timings'])
+            PAGE_PARSE_SECONDS.observe(sum(result['timings'].values()))
+
+            # Spring over hvis siden er et alias (rel=canonical) for en side der allerede er gemt
+            canonical_url = result['canonical_url'] or canonicalize_url(url, self.base_url)
+            record.canonical_url = canonical_url
+            if self.collapse_canonical_aliases and not self.saved_canonical_urls.add(canonical_url):
+                logging.info(f"Springer {url} over: kanonisk URL {canonical_url} er allerede gemt")
+                # Filen er allerede skrevet af konverteringen; et alias skal ikke uploades
+                os.remove(filepath)
+                return record
+
+            record.path = filepath
+            record.size = result['size']
+            record.content_hash = result['hash']
+            record.status = 'saved'
+            return record
+        except Exception as e:
+            record.status = 'failed'
+            logging.error(f"Fejl ved scraping af {url}: {e}", exc_info=True)
+            raise  # Genkaste undtagelsen for at fange den i Flask
+        finally:
+            if reserved:
+                await self.html_budget.release(reserved)
+            if record.status == 'pending':
+                record.status = 'skipped'
+            self.record_timings(filename, url, category, timer.stages)
+
+    def estimate_page_bytes(self, info):
+        """
+        Forventet HTML-størrelse for en side, der endnu ikke er hentet: Content-Length fra
+        pre-flight, ellers gennemsnittet af de sider der er hentet indtil videre.
+        """
+        if info and info.get('content_length'):
+            return info['content_length']
+        if self.fetched_pages:
+            return self.fetched_bytes // self.fetched_pages
+        return DEFAULT_PAGE_BYTES_ESTIMATE
+
+    async def monitor_memory(self, interval=0.5):
+        """
+        Sampler RSS for hovedprocessen og parse-workerne, indtil opgaven annulleres.
+        """
+        while True:
+            self.sample_memory()
+            await asyncio.sleep(interval)
+
+    def sample_memory(self):
+        rss = rss_bytes()
+        if rss is None:
+            # Uden /proc: brug procesens maksimale RSS (KiB på Linux)
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        self.peak_rss = max(self.peak_rss, rss)
+        executor = _parse_executor if self.parse_in_process_pool else None
+        if executor is not None:
+            workers = [rss_bytes(pid) for pid in list(getattr(executor, '_processes', None) or {})]
+            self.peak_worker_rss = max(self.peak_worker_rss, sum(r for r in workers if r))
+
+    def memory_summary(self):
+        """
+        Hukommelsesforbrug for jobbet til svaret fra /scrape.
+        """
+        summary = {
+            'peak_rss_mb': round(self.peak_rss / 1024 / 1024, 1),
+            'peak_worker_rss_mb': round(self.peak_worker_rss / 1024 / 1024, 1),
+            'budget_mb': None,
+            'peak_in_flight_html_mb': None,
+        }
+        if self.html_budget:
+            summary['budget_mb'] = round(self.html_budget.limit / 1024 / 1024, 1)
+            summary['peak_in_flight_html_mb'] = round(self.html_budget.peak / 1024 / 1024, 2)
+        return summary
 
-            # Ekstrakter Calendly URLs før parsing med BeautifulSoup
-            calendly_urls = self.extract_calendly_urls(html)
-            logging.info(f"Fundet {len(calendly_urls)} Calendly URL(s) i {url}")
+    def page_record(self, name, url=None, category=None, path=None, mimetype='text/plain'):
+        """
+        Returnerer PageRecord for filnavnet og opretter den, hvis den ikke findes.
+        """
+        record = self.pages.get(name)
+        if record is None:
+            record = self.pages[name] = PageRecord(name, url, category, path, mimetype)
+        return record
 
-            # Parse HTML
-            soup = BeautifulSoup(html, "html.parser")
-            soup = self.remove_html_comments_from_soup(soup)
-            logging.info(f"Parsed HTML for: {url}")
-
-            # Fjern uønskede elementer baseret på specifikke CSS-selektorer
-            for selector in self.unwanted_selectors:
-                removed_elements = soup.select(selector)
-                if removed_elements:
-                    logging.info(f"Fjernede {len(removed_elements)} elementer med selector '{selector}'")
-                for element in removed_elements:
-                    element.decompose()
-
-            # Fjern <script> og <style> tags for at undgå JavaScript i outputtet
-            removed_scripts = soup(['script', 'style'])
-            logging.info(f"Fjernede {len(removed_scripts)} <script>/<style> tags")
-            for script_or_style in removed_scripts:
-                script_or_style.decompose()
-
-            # Find alle produktsektioner
-            # Opdater denne selector til at matche dine produktcontainere
-            product_sections = soup.find_all('div', class_='product-item')  # Tilpas 'product-item' til dit website
-
-            formatted_text = f"URL: {url}\n\n"
-
-            if product_sections:
-                logging.info(f"Fundet {len(product_sections)} produktsektioner")
-                for idx, product in enumerate(product_sections, 1):
-                    product_info = self.extract_product_info(product, url)
-                    if product_info:
-                        formatted_text += f"### Produkt {idx}\n\n"
-                        formatted_text += product_info
-                        formatted_text += "\n---\n\n"
-            else:
-                logging.info("Ingen produktsektioner fundet, bruger process_element")
-                # Hvis ingen produkter findes, brug den eksisterende process_element funktion
-                body = soup.find('body')
-                if body:
-                    self.seen_paragraphs = set()
-                    formatted_text += self.process_element(body, url=url)
-
-            logging.info(f"Formatted text for {url}:\n{formatted_text[:500]}")  # Log de første 500 tegn
-
-            # Fjern gentagne afsnit
-            formatted_text = self.remove_duplicate_paragraphs(formatted_text)
-            logging.info(f"Efter fjernelse af duplikerede afsnit, længde: {len(formatted_text)} tegn")
-
-            # Udtræk og tilføj alle links dynamisk
-            all_links = set()
-            for link_tag in soup.find_all('a', href=True):
-                href = link_tag['href']
-                if href:
-                    if href.startswith('/'):
-                        # Relativ URL, gør den absolut
-                        href = urljoin(url, href)
-                    elif href.startswith('//'):
-                        # Schema-relative URL, tilføj 'https:'
-                        href = 'https:' + href
-                    elif not href.startswith(('http://', 'https://')):
-                        # Andre relative URLs
-                        href = urljoin(url, href)
-                    # Tilføj linket til all_links
-                    all_links.add(href)
-
-            # Tilføj Calendly URLs
-            for calendly_url in calendly_urls:
-                all_links.add(calendly_url)
-
-
-            # Fjern hoved-URL'en fra links hvis nødvendigt
-            all_links.discard(self.base_url)
-
-            # Kategoriser links
-            internal_links_set = set()
-            external_links_set = set()
-            base_netloc = urlparse(self.base_url).netloc.replace('www.', '')
-
-            # Always add base_url to internal links
-            internal_links_set.add(self.base_url)
-
-            for link in all_links:
-                parsed_href = urlparse(link)
-                href_domain = parsed_href.netloc.replace('www.', '')
-
-                if href_domain == base_netloc:
-                    if self.is_relevant_link(link):
-                        internal_links_set.add(link)
-                else:
-                    if self.is_relevant_link(link):
-                        external_links_set.add(link)
-
-            # Tilføj interne links til formatted_text
-            if internal_links_set:
-                formatted_text += "\n\n### Interne Links\n\n"
-                for internal_link in sorted(internal_links_set):  # Sorter links for konsistens
-                    if internal_link.rstrip('/') == self.base_url.rstrip('/'):
-                        # Special handling for base URL to show as "Forside"
-                        formatted_text += f"- [Forside]({internal_link})\n"
-                    else:
-                        formatted_text += f"- [{internal_link}]({internal_link})\n"
-                formatted_text += "\n"
+    def record_timings(self, name, url, category, stages):
+        """
+        Gemmer fasetider for en side (eller tilføjer til en eksisterende post, fx upload)
+        og logger dem som én struktureret JSON-linje.
+        """
+        self.page_record(name, url, category).add_timings(stages)
+        logging.info(json.dumps({'event': 'page_timings', 'name': name, 'url': url,
+                                 'stages': {stage: round(seconds, 4) for stage, seconds in stages.items()}}))
 
-            # Fjern alle forekomster af uønsket tekst generelt
-            unwanted_text_pattern = re.compile(
-                r'(Existing iframe|Skip to content|Back to top|Loading\.\.\.|radar_avada|Page load link|Go to Top)',
-                re.IGNORECASE
-            )
-            formatted_text = unwanted_text_pattern.sub('', formatted_text)
-            logging.info("Fjernede uønsket tekst")
-
-            # Rens og normaliser teksten
-            formatted_text = self.clean_and_normalize(formatted_text)
-            formatted_text = self.remove_image_lines(formatted_text)
-            logging.info("Rensede og normaliserede tekst")
-
-            # (Valgfrit) Fjern tomme links fra den formaterede tekst
-            formatted_text = re.sub(r'\[\]\(https?://[^\)]+\)', '', formatted_text)
-
-            # Gem teksten i fil
-            # Bestem hvilken mappe der skal bruges baseret på kategori
-            if category == 'interne':
-                target_dir = self.internal_output_dir
-            elif category == 'eksterne':
-                target_dir = self.external_output_dir
-            else:
-                target_dir = self.output_dir  # Fallback til hovedmappen
+    def timing_summary(self):
+        """
+        Samler fasetiderne for jobbet: antal, sum, gennemsnit, p50, p95 og max pr. fase
+        på tværs af sider, samt job-faser (find_links, crawl, boilerplate, upload).
+        """
+        per_stage = {}
+        for record in self.pages.values():
+            for stage, seconds in record.timings.items():
+                per_stage.setdefault(stage, []).append(seconds)
+
+        stages = {}
+        for stage, values in per_stage.items():
+            values.sort()
+            stages[stage] = {
+                'count': len(values),
+                'total': round(sum(values), 4),
+                'mean': round(sum(values) / len(values), 4),
+                'p50': values[len(values) // 2],
+                'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                'max': values[-1],
+            }
+        return {'pages': len(self.pages), 'job': self.job_timer.as_dict(), 'stages': stages}
 
-            filepath = os.path.join(target_dir, filename)
-            try:
-                with open(filepath, "w", encoding="utf-8") as file:
-                    file.write(formatted_text)
-                logging.info(f"Indhold gemt i '{filepath}' for URL: {url}")
-            except Exception as e:
-                logging.error(f"Fejl ved skrivning til fil: {filepath} ({e})", exc_info=True)
-                raise  # Genkaste undtagelsen for at fange den i Flask
+    def slowest_pages(self, limit):
+        """
+        De limit sider med den største samlede fasetid: URL, status og tider pr. fase.
+        Lokale stier og filnavne er udeladt, da listen returneres til klienten.
+        """
+        records = [record for record in self.pages.values() if record.url and record.timings]
+        records.sort(key=lambda record: sum(record.timings.values()), reverse=True)
+        return [
+            {
+                'url': record.url,
+                'status': record.status,
+                'total': round(sum(record.timings.values()), 4),
+                'timings': record.timings,
+            }
+            for record in records[:limit]
+        ]
 
-            # Rens for konsekutive gentagelser på sætningeniveau
-            self.remove_consecutive_repeated_sentences(filepath)
-            logging.info(f"Rensede gentagne sætninger i '{filepath}'")
-        except Exception as e:
-            logging.error(f"Fejl ved scraping af {url}: {e}", exc_info=True)
-            raise  # Genkaste undtagelsen for at fange den i Flask
+    def fetch_headers(self, url):
+        """
+        Henter Content-Type og størrelse for url uden at hente selve indholdet.
+        Bruger HEAD og falder tilbage til en GET af første byte, hvis serveren ikke understøtter HEAD.
+        Returnerer None hvis serveren ikke kan nås.
+        """
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=10)
+            if response.status_code in (405, 501) or 'Content-Type' not in response.headers:
+                response = self.session.get(
+                    url, headers={'Range': 'bytes=0-0'}, stream=True, allow_redirects=True, timeout=10
+                )
+                response.close()
+        except requests.RequestException as e:
+            logging.warning(f"Pre-flight fejlede for {url}: {e}")
+            return None
+
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        content_length = None
+        # Ved et ranged GET står den samlede størrelse i Content-Range ("bytes 0-0/12345")
+        content_range = response.headers.get('Content-Range', '')
+        if '/' in content_range and content_range.rsplit('/', 1)[1].isdigit():
+            content_length = int(content_range.rsplit('/', 1)[1])
+        elif response.headers.get('Content-Length', '').isdigit():
+            content_length = int(response.headers['Content-Length'])
+
+        return {
+            'status': response.status_code,
+            'content_type': content_type,
+            'content_length': content_length,
+            'final_url': response.url,
+        }
+
+    def document_kind(self, url):
+        """
+        Returnerer dokumenttypen ('pdf'/'docx') ud fra filendelsen, eller None.
+        """
+        extension = os.path.splitext(urlsplit(url).path.lower())[1]
+        return DOCUMENT_EXTENSIONS.get(extension)
+
+    def output_path(self, category, filename):
+        """
+        Returnerer stien til outputfilen i mappen for den givne kategori.
+        """
+        if category == 'interne':
+            target_dir = self.internal_output_dir
+        elif category == 'eksterne':
+            target_dir = self.external_output_dir
+        else:
+            target_dir = self.output_dir  # Fallback til hovedmappen
+        return os.path.join(target_dir, filename)
+
+    def download_document(self, url, suffix):
+        """
+        Streamer et dokument til en midlertidig fil uden at holde det i hukommelsen.
+        Afbryder og returnerer None, hvis dokumentet er større end max_document_bytes.
+        """
+        fd, path = tempfile.mkstemp(suffix=suffix, prefix="dokument_")
+        try:
+            with self.session.get(url, stream=True, timeout=30) as response, os.fdopen(fd, 'wb') as file:
+                response.raise_for_status()
+                size = 0
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_document_bytes:
+                        logging.info(f"Springer {url} over: dokumentet er større end {self.max_document_bytes} bytes")
+                        os.remove(path)
+                        return None
+                    file.write(chunk)
+            DOWNLOADED_BYTES.labels(kind='document').inc(size)
+            return path
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+    async def scrape_document(self, url, filename, category, kind, timer=None):
+        """
+        Henter et PDF- eller Word-dokument over HTTP og gemmer teksten i kategori-mappen.
+        Udtrækket køres i procespuljen ligesom HTML-konverteringen.
+        """
+        if not self.extract_documents:
+            logging.info(f"Springer {url} over: udtræk af dokumenter er slået fra")
+            return
+        if (kind == 'pdf' and PdfReader is None) or (kind == 'docx' and docx is None):
+            logging.warning(f"Springer {url} over: bibliotek til {kind}-udtræk er ikke installeret")
+            return
+
+        canonical_url = canonicalize_url(url, self.base_url)
+        if self.collapse_canonical_aliases and not self.saved_canonical_urls.add(canonical_url):
+            logging.info(f"Springer {url} over: kanonisk URL {canonical_url} er allerede gemt")
+            return
+
+        timer = timer or StageTimer()
+        timer.reset()
+        loop = asyncio.get_running_loop()
+        path = None
+        try:
+            path = await loop.run_in_executor(None, self.download_document, url, f".{kind}")
+        finally:
+            # Dokumentet blev ikke hentet; frigiv den kanoniske URL igen
+            if path is None and self.collapse_canonical_aliases:
+                self.saved_canonical_urls.discard(canonical_url)
+        timer.lap('fetch')
+        if path is None:
+            return
+        try:
+            filepath = self.output_path(category, filename)
+            executor = get_parse_executor() if self.parse_in_process_pool else None
+            stats = await loop.run_in_executor(
+                executor, extract_document_in_worker, path, kind, url, filepath, self.max_document_pages
+            )
+            # Udtræk og skrivning sker i samme gennemløb i workeren
+            PAGE_PARSE_SECONDS.observe(timer.elapsed())
+            timer.lap('convert')
+            logging.info(f"Dokument gemt i '{filepath}' for URL: {url} ({stats['blocks']} blokke, {stats['chars']} tegn)")
+            record = self.page_record(filename, url, category)
+            record.canonical_url = canonical_url
+            record.path = filepath
+            record.size = os.path.getsize(filepath)
+            record.content_hash = stats['hash']
+            record.status = 'saved'
+        except Exception:
+            if self.collapse_canonical_aliases:
+                self.saved_canonical_urls.discard(canonical_url)
+            raise
+        finally:
+            os.remove(path)
 
-    async def get_page_source_with_playwright(self, url):
+    def classify_response(self, info):
+        """
+        Bestemmer ud fra pre-flight-svaret, hvad der skal ske med en URL.
+        Returnerer ('render', None), ('document', content_type), ('skip', årsag) for sider
+        der med sikkerhed ikke skal gemmes, eller ('fail', årsag) for fejl der kan gå over.
+        """
+        # Kan serveren ikke nås, eller siger den intet om indholdet, lader vi browseren prøve
+        if info is None or not info['content_type']:
+            return 'render', None
+        # Kun 404/410 betyder at siden er væk; andre fejl (fx 500) kan være midlertidige
+        if info['status'] in (404, 410):
+            return 'skip', f"HTTP {info['status']}"
+        if info['status'] >= 400 and info['status'] not in (403, 405, 429):
+            return 'fail', f"HTTP {info['status']}"
+        if info['content_type'] in DOCUMENT_CONTENT_TYPES:
+            return 'document', DOCUMENT_CONTENT_TYPES[info['content_type']]
+        if info['content_type'] not in HTML_CONTENT_TYPES:
+            return 'skip', f"Content-Type {info['content_type']}"
+        if info['content_length'] is not None and info['content_length'] > self.max_page_bytes:
+            return 'skip', f"størrelse {info['content_length']} bytes"
+        return 'render', None
+
+    async def get_page_source_with_playwright(self, url, timer=None):
         """
         Henter sidekilden med forbedret fejlhåndtering og timeouts.
+        Er timer angivet, måles browserstart (launch), navigation (fetch) og rendering (render).
         """
+        timer = timer or StageTimer()
+        timer.reset()
+        fetch_start = time.perf_counter()
         browser = None
+        browser_launched = False
         try:
+            if self.pools is not None:
+                # Batch: åbn en ny kontekst i den delte browser i stedet for at starte en browser
+                return await self.load_page(await self.pools.get_browser(), url, timer, fetch_start)
+
             async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-gpu',
-                        '--disable-software-rasterizer'
-                    ]
-                )
-                context = await browser.new_context(
-                    user_agent=HEADERS["User-Agent"],
-                    viewport={'width': 1920, 'height': 1080}
-                )
-                page = await context.new_page()
-                
+                browser = await p.chromium.launch(headless=True, args=BROWSER_ARGS)
+                browser_launched = True
+                ACTIVE_BROWSERS.inc()
                 try:
-                    # Forøg timeout og deaktiver resourcetimeout
-                    await page.goto(
-                        url, 
-                        wait_until='domcontentloaded',
-                        timeout=60000
-                    )
-                    
-                    # Vent på body element som indikation på indlæst side
-                    await page.wait_for_selector('body', timeout=10000)
-                    
-                    # Hent HTML-indhold
-                    html = await page.content()
-                    return html
-                    
-                except Exception as e:
-                    logging.error(f"Fejl ved indlæsning af {url}: {str(e)}")
-                    return None
-                
+                    return await self.load_page(browser, url, timer, fetch_start)
                 finally:
-                    await context.close()
                     await browser.close()
                     
         except Exception as e:
@@ -527,6 +2177,46 @@ class WebScraper:
             if browser:
                 await browser.close()
             return None
+        finally:
+            if browser_launched:
+                ACTIVE_BROWSERS.dec()
+
+    async def load_page(self, browser, url, timer, fetch_start):
+        """
+        Åbner url i en ny kontekst i browseren og returnerer den renderede HTML (None ved fejl).
+        """
+        context = await browser.new_context(
+            user_agent=HEADERS["User-Agent"],
+            viewport={'width': 1920, 'height': 1080}
+        )
+        page = await context.new_page()
+        timer.lap('launch')
+        
+        try:
+            # Forøg timeout og deaktiver resourcetimeout
+            await page.goto(
+                url, 
+                wait_until='domcontentloaded',
+                timeout=60000
+            )
+            timer.lap('fetch')
+            
+            # Vent på body element som indikation på indlæst side
+            await page.wait_for_selector('body', timeout=10000)
+            
+            # Hent HTML-indhold
+            html = await page.content()
+            timer.lap('render')
+            PAGE_FETCH_SECONDS.observe(time.perf_counter() - fetch_start)
+            DOWNLOADED_BYTES.labels(kind='html').inc(len(html.encode('utf-8')))
+            return html
+            
+        except Exception as e:
+            logging.error(f"Fejl ved indlæsning af {url}: {str(e)}")
+            return None
+        
+        finally:
+            await context.close()
 
     def extract_product_info(self, product_element, base_url):
         try:
@@ -579,7 +2269,11 @@ class WebScraper:
             logging.error(f"Fejl ved udtrækning af produktinformation: {e}", exc_info=True)
             return ''
 
-    def process_element(self, element, parent_bold=False, url=None):
+    def process_element(self, element, parent_bold=False, url=None, context=None):
+        # Et kald uden context (fx direkte på et enkelt element) får sin egen sidetilstand
+        if context is None:
+            context = PageContext(url)
+        url = context.url
         text = ''
         is_current_bold = parent_bold
 
@@ -604,7 +2298,10 @@ class WebScraper:
             # Specifik behandling af 'a' tags uanset forælder
             if element.name == 'a':
                 link_text = element.get_text(strip=True)
-                link_href = element.get('href', '').strip()
+                # Brug den allerede opløste href fra sidens linkindeks, hvis tagget er med i det
+                link_href = context.link_index['by_element'].get(id(element), '') if context.link_index else ''
+                if not link_href:
+                    link_href = element.get('href', '').strip()
                 logging.info(f"Found <a> tag with text: '{link_text}' and href: '{link_href}'")
 
                 # Ekstrakter URLs fra onclick attributten hvis href er tom eller ugyldig
@@ -638,7 +2335,7 @@ class WebScraper:
                     for sibling in element.find_next_siblings():
                         if sibling.name and sibling.name.startswith('h'):
                             break
-                        content += self.process_element(sibling, url=url)
+                        content += self.process_element(sibling, context=context)
                     return formatted_heading + content
 
             # Hvis ikke en tag-baseret heading, tjek klasserne og style
@@ -664,7 +2361,7 @@ class WebScraper:
                             for sibling in element.find_next_siblings():
                                 if sibling.name and sibling.name.startswith('h'):
                                     break
-                                content += self.process_element(sibling, url=url)
+                                content += self.process_element(sibling, context=context)
                             return formatted_heading + content
 
             # Tjek for fed tekst baseret på klasser og inline stilarter
@@ -674,7 +2371,7 @@ class WebScraper:
             if element.name == 'p':
                 paragraph_text = ''
                 for child in element.children:
-                    child_text = self.process_element(child, parent_bold=is_current_bold, url=url)
+                    child_text = self.process_element(child, parent_bold=is_current_bold, context=context)
                     if child_text:
                         paragraph_text += child_text + ' '
                 paragraph_text = paragraph_text.strip()
@@ -683,15 +2380,15 @@ class WebScraper:
                 if paragraph_text:
                     # Trim og normaliser afsnittet
                     para_clean = self.clean_and_normalize(paragraph_text.strip())
-                    if para_clean not in self.seen_paragraphs:
-                        self.seen_paragraphs.add(para_clean)
+                    if para_clean not in context.seen_paragraphs:
+                        context.seen_paragraphs.add(para_clean)
                         text += paragraph_text + '\n\n'
                     else:
                         logging.info(f"Fjerner gentaget afsnit i process_element: {para_clean[:30]}...")
             elif element.name == 'li':
                 li_text = ''
                 for child in element.children:
-                    child_text = self.process_element(child, parent_bold=is_current_bold, url=url)
+                    child_text = self.process_element(child, parent_bold=is_current_bold, context=context)
                     if child_text:
                         li_text += child_text + ' '
                 li_text = li_text.strip()
@@ -765,7 +2462,7 @@ class WebScraper:
             else:
                 # Process child elements
                 for child in element.children:
-                    child_text = self.process_element(child, parent_bold=is_current_bold, url=url)
+                    child_text = self.process_element(child, parent_bold=is_current_bold, context=context)
                     if child_text:
                         text += child_text + ' '
                 if text:
@@ -838,86 +2535,22 @@ class WebScraper:
 
             return table_md
 
-    def remove_consecutive_repeated_sentences(self, filepath):
-            """
-            Fjerner kun konsekutive gentagelser af sætninger.
-            """
-            try:
-                with open(filepath, "r", encoding="utf-8") as file:
-                    lines = file.readlines()
-
-                unique_lines = []
-                previous_sentence = ""
-
-                for line in lines:
-                    # Del linjen i sætninger ved hjælp af punktum som separator
-                    sentences = re.split(r'\. |\.\n', line.strip())
-                    clean_sentences = []
-
-                    for sentence in sentences:
-                        sentence = sentence.strip()
-                        if sentence and sentence != previous_sentence:
-                            clean_sentences.append(sentence)
-                            previous_sentence = sentence
-
-                    # Sæt sætningerne sammen igen med ". " og tilføj til output
-                    if clean_sentences:
-                        unique_lines.append(". ".join(clean_sentences) + "\n")
-                    else:
-                        unique_lines.append("\n")
-
-                # Overskriv filen med unikke sætninger
-                with open(filepath, "w", encoding="utf-8") as file:
-                    file.writelines(unique_lines)
-                logging.info(f"Rensede gentagne sætninger i '{filepath}'")
-            except Exception as e:
-                logging.error(f"Fejl ved rensning af fil: {filepath} ({e})", exc_info=True)
-
     def is_relevant_link(self, link):
             """
             Bestemmer, om et link er relevant baseret på dets filendelse eller sti.
+            Har ingen sideeffekter; om en URL allerede er scraped holdes i enqueued_urls.
             """
             # Remove hash/fragment from URL before checking
             link = link.split('#')[0]
             
-            # Allow the exact base URL to be scraped
+            # The base URL is always relevant
             if link.rstrip('/') == self.base_url.rstrip('/'):
-                # Only return True if this is the first time we're seeing the base URL
-                if not hasattr(self, '_base_url_scraped'):
-                    self._base_url_scraped = True
-                    return True
-                return False
-
-            # Først tjek om linket indeholder nogle af de uønskede stier
-            excluded_paths = (
-                '/wp-content/',
-                '/wp-includes/',
-                '/uploads/',
-                '/plugins/',
-                '/themes/',
-                '/css/',
-                '/js/',
-                '/images/',
-                '/assets/',
-                '/cdn-cgi/',
-                '/fonts/'
-            )
-
-            if any(path in link.lower() for path in excluded_paths):
-                logging.info(f"Udelukker link pga. sti: {link}")
-                return False
-
-            # Tjek for uønskede filendelser
-            if any(link.lower().endswith(ext) for ext in self.excluded_extensions):
-                logging.info(f"Udelukker link pga. filendelse: {link}")
-                return False
-
-            # Tillad kun links uden filendelse eller med .html/.htm
-            if not re.search(r'\.\w+$', link) or link.lower().endswith(('.html', '.htm')):
                 return True
 
-            logging.info(f"Udelukker link: {link}")
-            return False
+            relevant, reason = self.link_filter.check(link)
+            if not relevant:
+                logging.info(f"Udelukker link pga. {reason}: {link}")
+            return relevant
 
     async def find_links(self, start_url):
             html = await self.get_page_source_with_playwright(start_url)
@@ -925,171 +2558,782 @@ class WebScraper:
                 return set(), set()
 
             soup = BeautifulSoup(html, "html.parser")
-            links = soup.find_all("a", href=True)
+            link_index = self.build_link_index(soup, start_url)
             internal_links = set()
             external_links = set()
 
-            base_netloc = urlparse(self.base_url).netloc.replace('www.', '')
-
-            for link in links:
-                href = link["href"].split('#')[0]  # Remove fragment
-                if not href:
-                    continue
-            
-                # Handle relative links
-                if href.startswith("/"):
-                    full_url = urljoin(start_url, href)
-                    if self.is_relevant_link(full_url):
-                        internal_links.add(full_url)
+            for link, entry in link_index['by_url'].items():
+                if not entry['relevant']:
                     continue
-                
-                # Handle absolute links
-                if href.startswith(("http://", "https://")):
-                    parsed_href = urlparse(href)
-                    href_domain = parsed_href.netloc.replace('www.', '')
-                    
-                    if href_domain == base_netloc:
-                        if self.is_relevant_link(href):
-                            internal_links.add(href)
-                    else:
-                        if self.is_relevant_link(href):
-                            external_links.add(href)
+                if entry['internal']:
+                    internal_links.add(link)
                 else:
-                    # Handle relative links without leading /
-                    full_url = urljoin(start_url, href)
-                    if self.is_relevant_link(full_url):
-                        internal_links.add(full_url)
+                    external_links.add(link)
 
             return internal_links, external_links
 
+    def build_frontier(self, internal_links, external_links):
+            """
+            Frontier: LinkRecords for interne og eksterne links; hver URL køes kun én gang.
+            """
+            frontier = []
+            for category, links in (('interne', internal_links), ('eksterne', external_links)):
+                for link in links:
+                    if not self.enqueued_urls.add(link):
+                        continue
+                    frontier.append(LinkRecord(link, category, f"{self.sanitize_filename(link)}.txt"))
+            return frontier
+
     async def run(self):
+            monitor = asyncio.create_task(self.monitor_memory())
             try:
-                # Hent alle links fra forsiden
-                internal_links, external_links = await self.find_links(self.base_url)
-                logging.info(f"Fundet {len(internal_links)} interne links og {len(external_links)} eksterne links.")
-                print(f"Fundet {len(internal_links)} interne links og {len(external_links)} eksterne links.")
-
-                if not internal_links and not external_links:
-                    logging.warning("Ingen links fundet. Tjek `find_links` funktionen.")
-                    return
+                self.job_timer.reset()
+                frontier = self.checkpoint.load_frontier() if self.checkpoint else []
+                if frontier:
+                    # Genoptag et afbrudt job: genskab færdige sider og crawl kun resten
+                    completed = self.restore_checkpoint()
+                    for link in frontier:
+                        self.enqueued_urls.add(link.url)
+                    frontier = [link for link in frontier if link.filename not in completed]
+                    self.job_timer.lap('restore')
+                    logging.info(f"Genoptager crawl fra checkpoint: {len(completed)} sider færdige, {len(frontier)} tilbage")
+                else:
+                    # Hent alle links fra forsiden
+                    internal_links, external_links = await self.find_links(self.base_url)
+                    self.job_timer.lap('find_links')
+                    logging.info(f"Fundet {len(internal_links)} interne links og {len(external_links)} eksterne links.")
+                    print(f"Fundet {len(internal_links)} interne links og {len(external_links)} eksterne links.")
 
-                tasks = []
+                    if not internal_links and not external_links:
+                        logging.warning("Ingen links fundet. Tjek `find_links` funktionen.")
+                        return
 
-                # Behandl interne links
-                for link in internal_links:
-                    cleaned_link = self.sanitize_filename(link)
-                    filename = f"{cleaned_link}.txt"
-                    tasks.append(self.scrape_page(link, filename, 'interne'))
+                    frontier = self.build_frontier(internal_links, external_links)
+                    if self.checkpoint:
+                        self.checkpoint.save_frontier(frontier)
 
-                # Behandl eksterne links
-                for link in external_links:
-                    cleaned_link = self.sanitize_filename(link)
-                    filename = f"{cleaned_link}.txt"
-                    tasks.append(self.scrape_page(link, filename, 'eksterne'))
+                tasks = [self.scrape_page(link.url, link.filename, link.category) for link in frontier]
 
-                # Begræns antallet af samtidige opgaver
-                semaphore = asyncio.Semaphore(10)
+                # Begræns antallet af samtidige opgaver; i en batch deles slots med de andre sites
+                if self.pools is not None:
+                    semaphore = self.pools.scheduler.slot(self.base_url)
+                else:
+                    semaphore = asyncio.Semaphore(self.max_concurrent_pages)
 
                 async def sem_task(task):
+                    QUEUED_PAGES.inc()
                     async with semaphore:
-                        await task
+                        QUEUED_PAGES.dec()
+                        IN_FLIGHT_PAGES.inc()
+                        try:
+                            record = await task
+                        finally:
+                            IN_FLIGHT_PAGES.dec()
+                    # Kun gemte sider og varige spring (404/410, ikke-HTML, aliaser) er færdige.
+                    # Fejlede sider (timeouts, browserfejl, 5xx) gemmes ikke og prøves igen ved genoptagelse
+                    if self.checkpoint and record.status in CHECKPOINT_STATUSES:
+                        self.checkpoint.save_page(record)
 
                 await asyncio.gather(*(sem_task(task) for task in tasks), return_exceptions=True)
+                self.job_timer.lap('crawl')
+
+                # Fjern afsnit der går igen på tværs af sitets sider
+                self.remove_boilerplate()
+                self.job_timer.lap('boilerplate')
 
             except Exception as e:
                 logging.error(f"Fejl i run metoden: {e}", exc_info=True)
+            finally:
+                monitor.cancel()
+                self.sample_memory()
 
-    def get_scraped_files(self):
+    def restore_checkpoint(self):
             """
-            Returner en liste af dictionaries med 'name' og 'content'.
+            Skriver de sider checkpointet har som færdige tilbage i outputmapperne og
+            returnerer deres filnavne.
+            """
+            completed = set()
+            for record, content in self.checkpoint.completed_pages():
+                if content is not None:
+                    record.path = self.output_path(record.category, record.name)
+                    with open(record.path, 'wb') as f:
+                        f.write(content)
+                    record.size = len(content)
+                    if record.canonical_url:
+                        self.saved_canonical_urls.add(record.canonical_url)
+                self.pages[record.name] = record
+                completed.add(record.name)
+            self.resumed_pages = len(completed)
+            return completed
+
+    def boilerplate_key(self, paragraph):
+        """
+        Returnerer en hash af et afsnit, uafhængig af whitespace og store/små bogstaver.
+        """
+        normalized = ' '.join(self.clean_and_normalize(paragraph).split()).lower()
+        return hashlib.sha1(normalized.encode('utf-8')).digest()
+
+    def split_page_content(self, content):
+        """
+        Deler en gemt side op i (afsnit, linksektion). URL-linjen og linksektionen
+        holdes uden for boilerplate-detektionen.
+        """
+        links_start = content.find("### Interne Links")
+        if links_start == -1:
+            body, links_section = content, ''
+        else:
+            body, links_section = content[:links_start], content[links_start:]
+        return body.split('\n\n'), links_section
+
+    def remove_boilerplate(self):
+        """
+        Fjerner afsnit der optræder på mere end `boilerplate_threshold` af de interne sider.
+        Forsiden beholder afsnittene, så indholdet stadig findes én gang i outputtet.
+        """
+        if self.boilerplate_threshold is None:
+            return
+
+        # Første gennemløb: tæl hvor mange sider hvert afsnit optræder på, én fil ad gangen
+        filepaths = [os.path.join(self.internal_output_dir, filename)
+                     for filename in os.listdir(self.internal_output_dir)]
+        if len(filepaths) < self.boilerplate_min_pages:
+            logging.info(f"Springer boilerplate-detektion over: kun {len(filepaths)} sider")
+            return
+
+        page_counts = {}
+        for filepath in filepaths:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                paragraphs, _ = self.split_page_content(f.read())
+            for key in {self.boilerplate_key(para) for para in paragraphs[1:] if para.strip()}:
+                page_counts[key] = page_counts.get(key, 0) + 1
+
+        max_pages = self.boilerplate_threshold * len(filepaths)
+        boilerplate = {key for key, count in page_counts.items() if count > max_pages}
+        del page_counts
+        if not boilerplate:
+            return
+
+        # Andet gennemløb: omskriv kun de sider der indeholder boilerplate-afsnit
+        front_page = os.path.join(self.internal_output_dir, "forside.txt")
+        removed_bytes = 0
+        for filepath in filepaths:
+            if filepath == front_page:
+                continue
+            with open(filepath, 'r', encoding='utf-8') as f:
+                paragraphs, links_section = self.split_page_content(f.read())
+            # Første afsnit er URL-linjen og skal altid bevares
+            kept = paragraphs[:1] + [
+                para for para in paragraphs[1:]
+                if not para.strip() or self.boilerplate_key(para) not in boilerplate
+            ]
+            if len(kept) == len(paragraphs):
+                continue
+            original_size = len('\n\n'.join(paragraphs))
+            body = '\n\n'.join(kept)
+            removed_bytes += original_size - len(body)
+            content = (body + links_section).encode('utf-8')
+            with open(filepath, 'wb') as f:
+                f.write(content)
+            record = self.pages.get(os.path.basename(filepath))
+            if record is not None:
+                record.size = len(content)
+                record.content_hash = hashlib.sha256(content).hexdigest()
+
+        logging.info(
+            f"Fjernede {len(boilerplate)} boilerplate-afsnit fra {len(filepaths)} sider "
+            f"({removed_bytes} tegn)"
+        )
+
+    def iter_page_files(self):
+            """
+            Returnerer (kategori, filnavn, sti) for alle gemte sider.
             """
-            files = []
-            # Gennemgå dine output mapper og indlæs filerne
             for category in ['interne', 'eksterne']:
                 directory = os.path.join(self.output_dir, category)
                 if not os.path.exists(directory):
                     continue
-                for filename in os.listdir(directory):
-                    filepath = os.path.join(directory, filename)
+                for filename in sorted(os.listdir(directory)):
+                    yield category, filename, os.path.join(directory, filename)
+
+    def write_bundle(self, compression=None):
+            """
+            Samler alle gemte sider i én JSONL-fil med en linje pr. side (url, title, category,
+            hash, markdown), evt. komprimeret med gzip eller zstd. Siderne læses én ad gangen.
+            Returnerer (filnavn, sti, MIME-type).
+            """
+            if compression not in BUNDLE_COMPRESSIONS:
+                raise ValueError(f"Ukendt komprimering: {compression}")
+            if compression == 'zstd' and zstandard is None:
+                raise ValueError("zstd-komprimering kræver pakken zstandard")
+
+            extension, mimetype = BUNDLE_COMPRESSIONS[compression]
+            bundle_name = f"{urlsplit(self.base_url).hostname}{extension}"
+            bundle_path = os.path.join(self.output_dir, bundle_name)
+
+            if compression == 'gzip':
+                stream = gzip.open(bundle_path, 'wt', encoding='utf-8')
+            elif compression == 'zstd':
+                stream = io.TextIOWrapper(
+                    zstandard.ZstdCompressor().stream_writer(open(bundle_path, 'wb')), encoding='utf-8'
+                )
+            else:
+                stream = open(bundle_path, 'w', encoding='utf-8')
+
+            with stream:
+                for category, filename, filepath in self.iter_page_files():
                     with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    files.append({'name': filename, 'content': content})
+                        markdown = f.read()
+                    url = markdown[len("URL: "):markdown.find('\n')] if markdown.startswith("URL: ") else None
+                    heading = HEADING_PATTERN.search(markdown)
+                    record = {
+                        'url': url,
+                        'title': heading.group(1) if heading else (url or filename),
+                        'category': category,
+                        'hash': hashlib.sha256(markdown.encode('utf-8')).hexdigest(),
+                        'markdown': markdown,
+                    }
+                    stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+            logging.info(f"Bundle skrevet til '{bundle_path}'")
+            return bundle_name, bundle_path, mimetype
+
+    def get_scraped_files(self, layout='files', compression=None):
+            """
+            Returner en liste af PageRecords for de filer der skal uploades.
+            layout='files' giver én fil pr. side; layout='bundle' giver én samlet JSONL-fil
+            (se write_bundle). Indholdet læses ikke ind; filerne streames fra disken ved upload.
+            """
+            if layout == 'bundle':
+                if not any(True for _ in self.iter_page_files()):
+                    return []
+                name, path, mimetype = self.write_bundle(compression)
+                record = self.page_record(name, path=path, mimetype=mimetype)
+                record.size = os.path.getsize(path)
+                record.status = 'saved'
+                return [record]
+            if layout != 'files':
+                raise ValueError(f"Ukendt layout: {layout}")
+
+            files = []
+            for category, filename, filepath in self.iter_page_files():
+                record = self.page_record(filename, category=category, path=filepath)
+                record.path = filepath
+                record.size = os.path.getsize(filepath)
+                files.append(record)
             return files
 
 
+def job_output_dir():
+    """
+    Ny outputmappe for ét job, så filer fra andre jobs (og tidligere kørsler) aldrig
+    indgår i boilerplate-detektion eller upload. Kalderen sletter den bagefter.
+    """
+    return os.path.join("/tmp/webscraping", f"job-{uuid.uuid4().hex}")
 
+def scraper_for_job(job, output_dir=None):
+    """
+    Opretter en WebScraper for et job i arbejdskøen ud fra de valgmuligheder coordinatoren gemte.
+    """
+    options = job['options']
+    return WebScraper(
+        job['base_url'],
+        boilerplate_threshold=None,
+        collapse_canonical_aliases=options.get('collapse_canonical_aliases', True),
+        link_rules=options.get('link_rules'),
+        preflight=options.get('preflight', True),
+        extract_documents=options.get('extract_documents', True),
+        output_dir=output_dir
+    )
 
-@app.route('/scrape', methods=['POST'])
-async def scrape_website():
+async def start_distributed_job(queue, base_url, folder_id, options):
     """
-    HTTP endpoint til at starte scraping og uploade til Google Drive.
+    Coordinator: finder sitets links og lægger dem i arbejdskøen som et nyt job.
+    Returnerer (job_id, antal køede sider).
     """
-    cors_headers = {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Methods': 'POST, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type',
-        'Access-Control-Max-Age': '3600'
+    job_id = uuid.uuid4().hex
+    job = {'job_id': job_id, 'base_url': base_url, 'folder_id': folder_id, 'options': options}
+    scraper = scraper_for_job(job, job_output_dir())
+    try:
+        internal_links, external_links = await scraper.find_links(base_url)
+    finally:
+        shutil.rmtree(scraper.output_dir, ignore_errors=True)
+    queue.create_job(job_id, base_url, folder_id, options)
+    queued = queue.enqueue(job_id, scraper.build_frontier(internal_links, external_links))
+    logging.info(f"Distribueret job {job_id} for {base_url}: {queued} sider i kø")
+    if not queued:
+        await finish_distributed_job(queue, job_id)
+    return job_id, queued
+
+async def finish_distributed_job(queue, job_id):
+    """
+    Uploader metadata.txt for jobbet, hvis dette kald er det der afslutter det.
+    """
+    if not queue.finish_job(job_id):
+        return
+    job = queue.job(job_id)
+    progress = queue.progress(job_id)
+    metadata = {
+        'URL': job['base_url'],
+        'Date Scraped': datetime.utcnow().isoformat() + 'Z',
+        'Total Pages': progress.get('saved', 0),
+        'Failed Pages': progress.get('failed', 0),
     }
+    metadata_content = '\n'.join([f"{k}: {v}" for k, v in metadata.items()])
+    await asyncio.get_running_loop().run_in_executor(
+        None, upload_to_drive, 'metadata.txt', metadata_content, job['folder_id']
+    )
+    logging.info(f"Distribueret job {job_id} færdigt: {progress}")
 
-    if request.method == 'OPTIONS':
-        return ('', 204, cors_headers)
-
-    request_json = request.get_json(silent=True)
+async def process_work_item(queue, scrapers, job_id, link):
+    """
+    Worker: scraper én side fra køen, uploader den til jobbets Drive-mappe og melder status tilbage.
+    """
+    record = None
+    try:
+        # Opslag og opsætning hører med i try, så en fejl her også markerer opgaven som fejlet
+        job = queue.job(job_id)
+        if job is None:
+            raise LookupError(f"Jobbet {job_id} findes ikke i køen")
+        scraper = scrapers.get(job_id)
+        if scraper is None:
+            scraper = scrapers[job_id] = scraper_for_job(job, job_output_dir())
+            scraper.saved_canonical_urls = QueueCanonicalSet(queue, job_id)
+        record = await scraper.scrape_page(link.url, link.filename, link.category)
+        if record.status == 'saved':
+            record.file_id = await asyncio.get_running_loop().run_in_executor(
+                None, upload_file_to_drive, record.name, record.path, job['folder_id'], record.mimetype
+            )
+        if record.status == 'failed':
+            # Midlertidig fejl (timeout, 5xx): sæt siden tilbage i køen til et nyt forsøg
+            queue.fail(job_id, link.url)
+        else:
+            queue.complete(job_id, link.url, record.status, record.file_id)
+    except Exception as e:
+        logging.error(f"Worker-fejl for {link.url} i job {job_id}: {e}", exc_info=True)
+        # Siden blev gemt men ikke uploadet; frigiv den kanoniske URL, så næste forsøg ikke springes over
+        if record is not None and record.status == 'saved' and record.canonical_url:
+            queue.release_canonical(job_id, record.canonical_url)
+        queue.fail(job_id, link.url)
+    await finish_distributed_job(queue, job_id)
+
+async def run_worker(queue, worker_id=None, idle_sleep=5.0, exit_when_idle=False):
+    """
+    Worker-løkke: leaser sider fra arbejdskøen og scraper dem, til processen stoppes
+    (eller køen er tom, hvis exit_when_idle er sat).
+    """
+    worker_id = worker_id or f"{os.uname().nodename}-{os.getpid()}"
+    batch_size = int(os.environ.get("MAX_CONCURRENT_PAGES", 10))
+    scrapers = {}
+    logging.info(f"Worker {worker_id} starter på kø {queue.path}")
+    try:
+        while True:
+            # Jobs hvis sidste opgaver er givet op (fx fordi en worker døde), afsluttes her
+            for job_id in queue.expire_leases():
+                await finish_distributed_job(queue, job_id)
+            items = queue.lease(worker_id, batch_size)
+            if not items:
+                if exit_when_idle:
+                    return
+                await asyncio.sleep(idle_sleep)
+                continue
+            await asyncio.gather(*(process_work_item(queue, scrapers, job_id, link) for job_id, link in items))
+            # Scrapere (og outputmapper) for jobs der er færdige, behøves ikke længere
+            for job_id in [job_id for job_id in scrapers if (queue.job(job_id) or {}).get('status') != 'running']:
+                shutil.rmtree(scrapers.pop(job_id).output_dir, ignore_errors=True)
+    finally:
+        for scraper in scrapers.values():
+            shutil.rmtree(scraper.output_dir, ignore_errors=True)
+
+
+def parse_scrape_request(request_json):
+    """
+    Validerer ét scrape-job (url, folder_id og valgmuligheder) fra en forespørgsel.
+    Returnerer (job, None) med de fortolkede værdier, eller (None, fejlbesked).
+    """
     if not request_json or 'url' not in request_json or 'folder_id' not in request_json:
         logging.error("Invalid request: Missing 'url' or 'folder_id'")
-        return jsonify({
-            'error': 'Please provide a valid URL and folder_id in the request body'
-        }), 400, cors_headers
+        return None, 'Please provide a valid URL and folder_id in the request body'
 
     url = request_json['url']
     folder_id = request_json['folder_id']
+    # folder_id indsættes i Drive-forespørgsler og skal være et rent Drive-ID
+    if not isinstance(folder_id, str) or not re.fullmatch(r'[A-Za-z0-9_-]+', folder_id):
+        logging.error(f"Invalid folder_id provided: {folder_id!r}")
+        return None, 'Invalid folder_id provided'
     base_url = sanitize_and_validate_url(url)
     if not base_url:
         logging.error(f"Invalid URL provided: {url}")
-        return jsonify({
-            'error': 'Invalid URL provided'
-        }), 400, cors_headers
+        return None, 'Invalid URL provided'
 
     try:
-        scraper = WebScraper(base_url)
+        link_rules = load_link_rules(base_url, request_json.get('link_rules'))
+    except (ValueError, TypeError) as e:
+        logging.error(f"Invalid link_rules: {e}")
+        return None, f'Invalid link_rules: {e}'
+
+    # 'files' giver én fil pr. side, 'bundle' én samlet JSONL-fil (evt. komprimeret)
+    output_layout = request_json.get('output', 'files')
+    compression = request_json.get('compression')
+    if output_layout not in ('files', 'bundle') or compression not in BUNDLE_COMPRESSIONS \
+            or (compression == 'zstd' and zstandard is None):
+        logging.error(f"Invalid output options: output={output_layout}, compression={compression}")
+        return None, 'Invalid output options: output must be "files" or "bundle", compression "gzip" or "zstd"'
+
+    memory_budget_mb = request_json.get('memory_budget_mb')
+    if memory_budget_mb is not None and (isinstance(memory_budget_mb, bool)
+                                         or not isinstance(memory_budget_mb, (int, float))
+                                         or memory_budget_mb <= 0):
+        logging.error(f"Invalid memory_budget_mb: {memory_budget_mb}")
+        return None, 'Invalid memory_budget_mb: must be a positive number'
+
+    # Andelen af interne sider et afsnit skal gå igen på (strengt mere end) for at blive
+    # fjernet; null slår det fra. Ved 1 kunne intet afsnit nogensinde fjernes, så 1 afvises
+    boilerplate_threshold = request_json.get('boilerplate_threshold', 0.6)
+    if boilerplate_threshold is not None and (isinstance(boilerplate_threshold, bool)
+                                              or not isinstance(boilerplate_threshold, (int, float))
+                                              or not 0 < boilerplate_threshold < 1):
+        logging.error(f"Invalid boilerplate_threshold: {boilerplate_threshold}")
+        return None, 'Invalid boilerplate_threshold: must be null or a number in (0, 1)'
+
+    return {
+        'base_url': base_url,
+        'folder_id': folder_id,
+        'link_rules': link_rules,
+        'output_layout': output_layout,
+        'compression': compression,
+        'memory_budget_mb': memory_budget_mb,
+        'options': request_json,
+    }, None
+
+async def run_scrape_job(job, pools=None, output_dir=None):
+    """
+    Crawler ét site og uploader resultatet til Drive ud fra et job fra parse_scrape_request.
+    Med pools deles browser, HTTP-session og Drive-klient med andre jobs (se SharedPools).
+    Returnerer (svar, HTTP-status).
+    """
+    request_json = job['options']
+    base_url = job['base_url']
+    folder_id = job['folder_id']
+    link_rules = job['link_rules']
+    output_layout = job['output_layout']
+    compression = job['compression']
+    memory_budget_mb = job['memory_budget_mb']
+
+    QUEUED_JOBS.inc()
+    profiler = None
+    checkpoint = None
+    cache = None
+    try:
+        async def drive(function, *args, **kwargs):
+            # I en batch køres Drive-kald på pools' Drive-tråd; ellers direkte som hidtil
+            if pools is not None:
+                return await pools.drive(function, *args, **kwargs)
+            return function(*args, **kwargs)
+
+        # Er sitet crawlet for nylig med samme valg, genbruges filerne frem for at crawle igen.
+        # cache=false tvinger et nyt crawl (og opdaterer cachen). Profilerede jobs går helt
+        # uden om cachen: de skal måle et rigtigt crawl, og deres tider skal ikke genbruges
+        if RESULT_CACHE_TTL > 0 and not request_json.get('profile', False):
+            cache = ResultCache(os.path.join(CHECKPOINT_DIR, 'results.sqlite'))
+            # Nøglen skal rumme alle valg der ændrer outputtet
+            cache_key = checkpoint_key(
+                canonicalize_url(base_url), output_layout, compression, link_rules,
+                request_json.get('extract_documents', True),
+                request_json.get('boilerplate_threshold', 0.6),
+                request_json.get('collapse_canonical_aliases', True),
+                request_json.get('preflight', True)
+            )
+            cached = cache.get(cache_key) if request_json.get('cache', True) else None
+            # Sync til en anden mappe skal opdatere dens filer, ikke lægge kopier ved siden af
+            if cached and (cached['folder_id'] == folder_id or not request_json.get('sync', False)):
+                response = await drive(reuse_cached_result, cache, cache_key, cached, base_url, folder_id)
+                if response is not None:
+                    return response, 200
+
+        # Et job der køres igen (fx efter en genstart af instansen) genoptager fra sit checkpoint
+        if request_json.get('resume', True):
+            checkpoint = CrawlCheckpoint(
+                os.path.join(CHECKPOINT_DIR, 'checkpoints.sqlite'),
+                checkpoint_key(base_url, folder_id, output_layout, compression, link_rules,
+                               request_json.get('extract_documents', True))
+            )
+        # Profileren ser kun hovedprocessen, så et profileret job parser sine sider her i stedet
+        # for i procespuljen; ellers ville profilen mangle selve parsingen
+        profile = request_json.get('profile', False)
+        scraper = WebScraper(
+            base_url,
+            boilerplate_threshold=request_json.get('boilerplate_threshold', 0.6),
+            parse_in_process_pool=not profile,
+            collapse_canonical_aliases=request_json.get('collapse_canonical_aliases', True),
+            link_rules=link_rules,
+            preflight=request_json.get('preflight', True),
+            extract_documents=request_json.get('extract_documents', True),
+            memory_budget_mb=memory_budget_mb,
+            checkpoint=checkpoint,
+            pools=pools,
+            output_dir=output_dir
+        )
+        # Opt-in profilering af hele jobbet; artefakterne gemmes ved siden af outputtet
+        if profile:
+            profiler = CrawlProfiler(os.path.join(scraper.output_dir, 'profil'))
+            profiler.start()
+
         await scraper.run()  # Nu kan vi await direkte
-        files = scraper.get_scraped_files()
+        files = scraper.get_scraped_files(output_layout, compression)
+        scraper.job_timer.lap('collect')
         if not files:
             logging.warning("Ingen filer blev scraped.")
-            return jsonify({
+            if checkpoint:
+                checkpoint.clear()
+            return {
+                'url': base_url,
                 'message': 'No files scraped.',
                 'files_uploaded': 0,
                 'status': 'no_files'
-            }), 200, cors_headers
-
-        # Upload scraped files til Google Drive
-        for file in files:
-            upload_to_drive(file['name'], file['content'], folder_id)
+            }, 200
 
         # Indsæt metadata
         metadata = {
             'URL': base_url,
             'Date Scraped': datetime.utcnow().isoformat() + 'Z',
-            'Total Pages': len(files)
+            'Total Pages': sum(1 for _ in scraper.iter_page_files())
         }
         metadata_content = '\n'.join([f"{k}: {v}" for k, v in metadata.items()])
-        upload_to_drive('metadata.txt', metadata_content, folder_id)
+
+        if request_json.get('sync', False):
+            # Opdater mappen på stedet i stedet for at oprette nye filer ved hver kørsel
+            metadata_path = os.path.join(scraper.output_dir, 'metadata.txt')
+            with open(metadata_path, 'w', encoding='utf-8') as f:
+                f.write(metadata_content)
+            metadata_record = scraper.page_record('metadata.txt', path=metadata_path)
+            # Sider der fejlede i denne kørsel er ikke forsvundet fra sitet; behold dem i mappen
+            failed = {record.name for record in scraper.pages.values() if record.status == 'failed'}
+            sync_stats = await drive(sync_files_to_drive, files + [metadata_record], folder_id, keep=failed)
+            files_uploaded = sync_stats['created'] + sync_stats['updated']
+            metadata_file_id = metadata_record.file_id
+        else:
+            # Upload scraped files til Google Drive
+            files_uploaded = 0
+            for file in files:
+                start = time.perf_counter()
+                md5 = file_md5(file.path) if checkpoint else None
+                previous = checkpoint.uploaded_file(file.name) if checkpoint else None
+                if previous and previous[1] == md5:
+                    # Uploadet af et tidligere forsøg på samme job
+                    file.file_id = previous[0]
+                    file.status = 'unchanged'
+                    continue
+                file.file_id = await drive(
+                    upload_file_to_drive, file.name, file.path, folder_id, file.mimetype,
+                    file_id=previous[0] if previous else None
+                )
+                if checkpoint:
+                    checkpoint.save_upload(file.name, file.file_id, md5)
+                file.add_timings({'upload': time.perf_counter() - start})
+                file.status = 'uploaded'
+                files_uploaded += 1
+            metadata_file_id = await drive(upload_to_drive, 'metadata.txt', metadata_content, folder_id)
+            sync_stats = None
+            files_uploaded += 1
+        scraper.job_timer.lap('upload')
 
         logging.info(f"Scraping and upload completed successfully for {base_url}")
-        return jsonify({
+        response = {
             'url': base_url,
-            'files_uploaded': len(files) + 1,
+            'files_uploaded': files_uploaded,
             'status': 'success'
-        }), 200, cors_headers
+        }
+        if sync_stats is not None:
+            response['sync'] = sync_stats
+        if checkpoint:
+            # Jobbet er færdigt; en ny forespørgsel skal crawle forfra
+            checkpoint.clear()
+            response['resumed_pages'] = scraper.resumed_pages
+        if cache is not None:
+            produced = [{'name': file.name, 'file_id': file.file_id, 'mimetype': file.mimetype} for file in files]
+            produced.append({'name': 'metadata.txt', 'file_id': metadata_file_id, 'mimetype': 'text/plain'})
+            if all(file['file_id'] for file in produced):
+                cache.put(cache_key, base_url, folder_id, produced)
+
+        if profiler is not None and profiler.running:
+            timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+            response['profile'] = []
+            response['profile_note'] = 'Pages were parsed in the main process (parse_in_process_pool disabled) so the profile covers parsing'
+            for path in profiler.stop():
+                name = f"{timestamp}_{os.path.basename(path)}"
+                file_id = await drive(upload_file_to_drive, name, path, folder_id)
+                response['profile'].append({'name': name, 'path': path, 'file_id': file_id})
+
+        # Fasetider for jobbet logges som én JSON-linje og returneres i svaret
+        timing_summary = scraper.timing_summary()
+        logging.info(json.dumps({'event': 'scrape_timings', 'url': base_url, **timing_summary}))
+        response['timings'] = {
+            'summary': timing_summary,
+            'slowest_pages': scraper.slowest_pages(TIMINGS_SLOWEST_PAGES),
+        }
+        response['memory'] = scraper.memory_summary()
+        logging.info(json.dumps({'event': 'scrape_memory', 'url': base_url, **response['memory']}))
+        return response, 200
 
     except Exception as e:
         logging.error(f"Error processing request for {base_url}: {e}", exc_info=True)
-        return jsonify({
+        return {
             'error': str(e),
             'url': base_url,
             'status': 'error'
-        }), 500, cors_headers
+        }, 500
+    finally:
+        QUEUED_JOBS.dec()
+        if profiler is not None and profiler.running:
+            profiler.stop()
+        if checkpoint is not None:
+            checkpoint.close()
+        if cache is not None:
+            cache.close()
+
+
+@app.route('/scrape', methods=['POST'])
+async def scrape_website():
+    """
+    HTTP endpoint til at starte scraping og uploade til Google Drive.
+    """
+    cors_headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Max-Age': '3600'
+    }
+
+    if request.method == 'OPTIONS':
+        return ('', 204, cors_headers)
+
+    request_json = request.get_json(silent=True)
+    job, error = parse_scrape_request(request_json)
+    if error:
+        return jsonify({'error': error}), 400, cors_headers
+    base_url = job['base_url']
+    folder_id = job['folder_id']
+
+    if request_json.get('distributed', False):
+        # Coordinator: læg sitets sider i den delte kø og lad workers (python main.py worker) crawle dem
+        if job['output_layout'] != 'files' or request_json.get('sync', False):
+            return jsonify({
+                'error': 'Distributed mode supports only output "files" without sync'
+            }), 400, cors_headers
+        queue = WorkQueue(WORK_QUEUE_PATH)
+        try:
+            job_id, queued = await start_distributed_job(queue, base_url, folder_id, {
+                'collapse_canonical_aliases': request_json.get('collapse_canonical_aliases', True),
+                'link_rules': job['link_rules'],
+                'preflight': request_json.get('preflight', True),
+                'extract_documents': request_json.get('extract_documents', True),
+            })
+        except Exception as e:
+            logging.error(f"Error starting distributed job for {base_url}: {e}", exc_info=True)
+            return jsonify({'error': str(e), 'url': base_url, 'status': 'error'}), 500, cors_headers
+        finally:
+            queue.close()
+        return jsonify({'url': base_url, 'job_id': job_id, 'queued': queued, 'status': 'queued'}), 202, cors_headers
+
+
+    output_dir = job_output_dir()
+    try:
+        response, status = await run_scrape_job(job, output_dir=output_dir)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return jsonify(response), status, cors_headers
+
+@app.route('/scrape/batch', methods=['POST'])
+async def scrape_batch():
+    """
+    HTTP endpoint til at scrape flere sites i én forespørgsel: {'sites': [{url, folder_id}, ...]}.
+    Øvrige felter gælder for alle sites og kan overskrives pr. site. Sitene deler browser,
+    HTTP-session, Drive-klient og sideslots (fordelt i round-robin mellem sitene).
+    """
+    cors_headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Max-Age': '3600'
+    }
+
+    if request.method == 'OPTIONS':
+        return ('', 204, cors_headers)
+
+    request_json = request.get_json(silent=True) or {}
+    sites = request_json.get('sites')
+    if not isinstance(sites, list) or not sites or len(sites) > BATCH_MAX_SITES:
+        logging.error("Invalid batch request: 'sites' missing, empty or too long")
+        return jsonify({
+            'error': f"Please provide 'sites' as a list of 1-{BATCH_MAX_SITES} objects with url and folder_id"
+        }), 400, cors_headers
+
+    # Profilering og distribueret mode gælder hele processen og understøttes ikke pr. site
+    defaults = {key: value for key, value in request_json.items()
+                if key not in ('sites', 'profile', 'distributed')}
+    jobs = []
+    for index, site in enumerate(sites):
+        if not isinstance(site, dict):
+            return jsonify({'error': f'Site {index}: must be an object'}), 400, cors_headers
+        options = {**defaults, **site}
+        options.pop('profile', None)
+        job, error = parse_scrape_request(options)
+        if error:
+            return jsonify({'error': f'Site {index}: {error}'}), 400, cors_headers
+        jobs.append(job)
+
+    # Hvert site får sin egen outputmappe, så filer fra forskellige sites ikke blandes
+    batch_dir = os.path.join("/tmp/webscraping", f"batch-{uuid.uuid4().hex}")
+    pools = SharedPools(int(os.environ.get("MAX_CONCURRENT_PAGES", 10)))
+    try:
+        results = await asyncio.gather(*(
+            run_scrape_job(job, pools=pools, output_dir=os.path.join(batch_dir, str(index)))
+            for index, job in enumerate(jobs)
+        ))
+    finally:
+        await pools.close()
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+    sites_response = []
+    for job, (response, status) in zip(jobs, results):
+        response.setdefault('url', job['base_url'])
+        response['folder_id'] = job['folder_id']
+        response['http_status'] = status
+        sites_response.append(response)
+    failed = sum(1 for response in sites_response if response['status'] == 'error')
+    logging.info(f"Batch færdig: {len(jobs) - failed} af {len(jobs)} sites uden fejl")
+    return jsonify({
+        'status': 'success' if not failed else ('error' if failed == len(jobs) else 'partial'),
+        'sites': sites_response,
+    }), 200, cors_headers
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Status og fremdrift for et distribueret job.
+    """
+    queue = WorkQueue(WORK_QUEUE_PATH)
+    try:
+        job = queue.job(job_id)
+        if job is None:
+            return jsonify({'error': 'Unknown job'}), 404
+        job.pop('options')
+        job['progress'] = queue.progress(job_id)
+        return jsonify(job), 200
+    finally:
+        queue.close()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus-endpoint med metrikker for scraping, browsere og Drive-upload.
+    """
+    return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
 
 # Opdater main blokken
 if __name__ == "__main__":
-    uvicorn.run(asgi_app, host="0.0.0.0", port=int(os.environ.get('PORT', 8080)))
+    if sys.argv[1:2] == ['worker']:
+        # Distribueret mode: python main.py worker [--exit-when-idle]
+        asyncio.run(run_worker(WorkQueue(WORK_QUEUE_PATH), exit_when_idle='--exit-when-idle' in sys.argv))
+    else:
+        uvicorn.run(asgi_app, host="0.0.0.0", port=int(os.environ.get('PORT', 8080)))
@@ -0,0 +1,36 @@
+import pytest
+
+main = pytest.importorskip("main")
+
+
+@pytest.fixture
+def scraper():
+    return main.WebScraper("https://kunde.dk", link_rules={})
+
+
+@pytest.mark.parametrize("link", [
+    "https://kunde.dk/wp-content/uploads/2024/prisliste.pdf",
+    "https://kunde.dk/uploads/terms.pdf",
+    "https://kunde.dk/assets/docs/produktark.docx",
+])
+def test_documents_under_asset_paths_are_relevant(scraper, link):
+    assert scraper.is_relevant_link(link)
+
+
+@pytest.mark.parametrize("link", [
+    "https://kunde.dk/wp-content/uploads/2024/logo.png",
+    "https://kunde.dk/wp-content/themes/kunde/",
+    "https://kunde.dk/assets/app.js",
+])
+def test_assets_are_not_relevant(scraper, link):
+    assert not scraper.is_relevant_link(link)
+
+
+def test_documents_follow_extract_documents():
+    scraper = main.WebScraper("https://kunde.dk", link_rules={}, extract_documents=False)
+    assert not scraper.is_relevant_link("https://kunde.dk/wp-content/uploads/2024/prisliste.pdf")
+
+
+def test_customer_exclude_still_applies_to_documents():
+    scraper = main.WebScraper("https://kunde.dk", link_rules={"exclude": ["/intern/"]})
+    assert not scraper.is_relevant_link("https://kunde.dk/wp-content/uploads/intern/plan.pdf")
@@ -0,0 +1,100 @@
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+class CrawlProfiler:
+    """
+    Opt-in profilering af et crawl. En samplende profiler tager stakken for alle tråde med
+    et fast interval og gemmer den i "collapsed stack"-formatet, som kan vises som flame
+    graph (flamegraph.pl, speedscope). Samtidig måler tracemalloc allokeringerne.
+    tracemalloc gør parsing flere gange langsommere, og mere for hver ekstra stakramme, så som
+    standard gemmes kun allokeringslinjen (PROFILE_TRACE_FRAMES=0 slår målingen fra).
+    Kun ét crawl ad gangen kan profileres, da tracemalloc er global for processen.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, output_dir, interval=0.005, top=50, trace_frames=None):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.top = top
+        if trace_frames is None:
+            trace_frames = int(os.environ.get("PROFILE_TRACE_FRAMES", 1))
+        self.trace_frames = trace_frames
+        self.running = False
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+
+    def start(self):
+        if not CrawlProfiler._lock.acquire(blocking=False):
+            logging.warning("Et andet crawl profileres allerede; profilering springes over")
+            return False
+        self.running = True
+        self._started = time.perf_counter()
+        if self.trace_frames > 0:
+            tracemalloc.start(self.trace_frames)
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def _sample(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ';'.join([names.get(ident, str(ident)), *reversed(stack)])
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def stop(self):
+        """
+        Stopper profileringen og skriver profil.collapsed og allokeringer.txt i output_dir.
+        Returnerer stierne til de skrevne filer.
+        """
+        if not self.running:
+            return []
+        self._stop.set()
+        self._thread.join()
+        elapsed = time.perf_counter() - self._started
+        snapshot = None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        self.running = False
+        CrawlProfiler._lock.release()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        collapsed_path = os.path.join(self.output_dir, "profil.collapsed")
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+        allocations_path = os.path.join(self.output_dir, "allokeringer.txt")
+        with open(allocations_path, "w", encoding="utf-8") as f:
+            f.write(f"Varighed: {elapsed:.1f} s, {sum(self.samples.values())} samples\n")
+            if snapshot is None:
+                f.write("Allokeringer blev ikke målt (PROFILE_TRACE_FRAMES=0)\n")
+            else:
+                f.write(f"Hukommelse (tracemalloc): nu {current / 1024 / 1024:.1f} MB, peak {peak / 1024 / 1024:.1f} MB\n\n")
+                f.write(f"Top {self.top} allokeringer efter linje:\n")
+                for stat in snapshot.statistics('lineno')[:self.top]:
+                    f.write(f"{stat}\n")
+                if self.trace_frames > 1:
+                    f.write(f"\nTop {self.top} allokeringer efter stak:\n")
+                    for stat in snapshot.statistics('traceback')[:self.top]:
+                        f.write(f"\n{stat.size / 1024:.1f} KiB i {stat.count} blokke\n")
+                        f.write('\n'.join(stat.traceback.format()) + '\n')
+
+        logging.info(f"Profil gemt i {collapsed_path} og {allocations_path}")
+        return [collapsed_path, allocations_path]
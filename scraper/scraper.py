@@ -5,6 +5,7 @@ import os
 import re
 import unicodedata
 import logging
+import argparse
 from urllib.parse import urlparse, urljoin
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -15,6 +16,8 @@ from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import WebDriverException
 
+from profiling import CrawlProfiler
+
 class WebScraper:
     def __init__(self, base_url):
         self.base_url = base_url.rstrip('/')
@@ -884,6 +887,11 @@ class WebScraper:
             logging.error(f"Fejl i run metoden: {e}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Scraper et website til tekstfiler")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profilér crawlet; profil og allokeringsrapport gemmes i outputmappen under 'profil'")
+    args = parser.parse_args()
+
     # Konfigurer logging - fjern # for at få en logfil med
     #logging.basicConfig(
     #    level=logging.INFO,
@@ -912,7 +920,15 @@ def main():
     print(f"Endelig URL: {user_input}")
 
     scraper = WebScraper(user_input)
-    asyncio.run(scraper.run())
+    profiler = CrawlProfiler(os.path.join(scraper.output_dir, 'profil')) if args.profile else None
+    if profiler:
+        profiler.start()
+    try:
+        asyncio.run(scraper.run())
+    finally:
+        if profiler:
+            for path in profiler.stop():
+                print(f"Profil gemt: {path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,9 +5,12 @@ import os
 import re
 import unicodedata
 import logging
+import argparse
 from urllib.parse import urlparse, urljoin
 from playwright.async_api import async_playwright
 
+from profiling import CrawlProfiler
+
 class WebScraper:
     def __init__(self, base_url):
         self.base_url = base_url.rstrip('/')
@@ -862,6 +865,11 @@ class WebScraper:
             logging.error(f"Fejl i run metoden: {e}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Scraper et website til tekstfiler")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profilér crawlet; profil og allokeringsrapport gemmes i outputmappen under 'profil'")
+    args = parser.parse_args()
+
     # Spørg brugeren om URL'en, der skal scrapes
     user_input = input("Indtast den URL, der skal scrapes: ").strip()
 
@@ -880,7 +888,15 @@ def main():
     print(f"Endelig URL: {user_input}")
 
     scraper = WebScraper(user_input)
-    asyncio.run(scraper.run())
+    profiler = CrawlProfiler(os.path.join(scraper.output_dir, 'profil')) if args.profile else None
+    if profiler:
+        profiler.start()
+    try:
+        asyncio.run(scraper.run())
+    finally:
+        if profiler:
+            for path in profiler.stop():
+                print(f"Profil gemt: {path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file